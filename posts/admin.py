@@ -1,30 +1,159 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
 
-from .models import Comment, Group, Post
+from . import search, thumbnails
+from .models import Comment, Group, Post, UserStats
 
 
-class PostAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'text', 'pub_date', 'author')
+def estimated_count(queryset):
+    """Rows in the table of ``queryset``, from the statistics
+    ``ANALYZE`` keeps in ``sqlite_stat1``, or else the largest
+    primary key. Both are an index lookup at most.
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+                    [queryset.model._meta.db_table],
+                )
+                rows = [int(stat.split()[0]) for stat, in cursor]
+                if rows:
+                    return max(rows)
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk')
+    )['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Changelist paginator that never counts a big table.
+
+    Up to ``ADMIN_EXACT_COUNT_LIMIT`` rows are counted exactly. An
+    unfiltered changelist of a bigger table shows ``estimated_count``
+    (``estimated``), a filtered one stops counting at the limit
+    (``bounded``); ``admin/posts/pagination.html`` labels both. A page
+    past the real end of an estimate is the last real page, counted
+    exactly then. A bounded count is a lower bound: opening a page
+    counts on to one row past it, so the next page stays reachable
+    while rows remain.
+    """
+
+    estimated = bounded = False
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if estimate > limit:
+                self.estimated = True
+                return estimate
+        count = self.object_list.order_by()[:limit].count()
+        self.bounded = count == limit
+        return count
+
+    def page(self, number):
+        if self.bounded:
+            self.count_past(number)
+        page = super().page(number)
+        if self.estimated and page.number > 1 and not page.object_list:
+            self.estimated = False
+            self.__dict__['count'] = self.object_list.count()
+            self.__dict__.pop('num_pages', None)
+            return super().page(self.num_pages)
+        return page
+
+    def count_past(self, number):
+        try:
+            bound = int(number) * self.per_page + 1
+        except (TypeError, ValueError):
+            return  # Paginator reports it.
+        if bound > self.count:
+            count = self.object_list.order_by()[:bound].count()
+            self.bounded = count == bound
+            self.__dict__['count'] = count
+            self.__dict__.pop('num_pages', None)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelists that stay fast on millions of rows."""
+
+    paginator = EstimatedCountPaginator
+    # The "N total" next to a filtered count is another full COUNT(*).
+    show_full_result_count = False
+
+
+class FullTextSearchMixin:
+    """Admin search through a ``posts.search`` index
+    instead of ``LIKE '%term%'`` over ``search_fields``.
+    """
+
+    search_index = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.enabled():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        match = search.match_expression(search_term)
+        if match is None:
+            return queryset.none(), False
+        return queryset.filter(
+            pk__in=self.search_index.matching(match)
+        ), False
+
+
+class PostAdmin(FullTextSearchMixin, ScalableAdmin):
+    list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
+    search_index = search.POSTS
+    # Fixed date ranges, unlike filters over the values of a column.
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(obj)
+
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(ScalableAdmin):
     list_display = ('pk', 'title', 'description', 'slug')
     search_fields = ('title',)
-    list_filter = ('description',)
     prepopulated_fields = {'slug': ('title',)}
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, ScalableAdmin):
     list_display = ('pk', 'text', 'author', 'created')
+    list_select_related = ('author',)
     search_fields = ('text',)
-    list_filter = ('author',)
+    search_index = search.COMMENTS
+    date_hierarchy = 'created'
+    autocomplete_fields = ('author',)
+    raw_id_fields = ('post',)
     empty_value_display = '-пусто-'
 
 
+class UserStatsAdmin(ScalableAdmin):
+    list_display = ('user', 'followers', 'following', 'posts', 'comments')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(UserStats, UserStatsAdmin)
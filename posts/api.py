@@ -0,0 +1,284 @@
+"""Read-only JSON API of the feeds, version 1, under ``/api/v1/``.
+
+The endpoints mirror ``index``, ``group_posts``, ``profile``,
+``post_view`` and ``follow_index``. Rows are read with ``values()``,
+author and group joined into the same query, and turned into JSON
+without building model instances. ``?fields=id,author`` selects the
+fields of a post, so unneeded columns and the comment count subquery
+are not read at all. Lists are paginated by the keyset cursors of
+``posts.paginator``; the public endpoints have the ETags of the pages
+they mirror and are kept by ``posts.pagecache`` like them.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.urls import path, reverse
+
+from posts import conditional, thumbnails, timeline
+from posts.models import Comment, Group, Post, TimelineEntry, User
+from posts.paginator import CursorPaginator, InvalidCursor
+
+
+def author_field(row):
+    return {
+        'id': row['author_id'],
+        'username': row['author__username'],
+        'first_name': row['author__first_name'],
+        'last_name': row['author__last_name'],
+    }
+
+
+def group_field(row):
+    if row['group_id'] is None:
+        return None
+    return {
+        'id': row['group_id'],
+        'slug': row['group__slug'],
+        'title': row['group__title'],
+    }
+
+
+def image_field(row):
+    name = row['image']
+    if not name:
+        return None
+    thumbnails_urls = {}
+    for geometry in settings.POST_THUMBNAIL_SIZES:
+        thumbnail = thumbnails.ready_image(name, geometry)
+        thumbnails_urls[geometry] = (
+            thumbnail.url if thumbnail else default_storage.url(name)
+        )
+    return {'url': default_storage.url(name), 'thumbnails': thumbnails_urls}
+
+
+# name -> (``values()`` lookups it is built from, builder of the value)
+POST_FIELDS = {
+    'id': (['id'], lambda row: row['id']),
+    'url': (
+        ['id', 'author__username'],
+        lambda row: reverse(
+            'post', args=[row['author__username'], row['id']]
+        ),
+    ),
+    'pub_date': (['pub_date'], lambda row: row['pub_date']),
+    'text': (['text'], lambda row: row['text']),
+    'summary_html': (['summary_html'], lambda row: row['summary_html']),
+    'author': (
+        [
+            'author_id', 'author__username',
+            'author__first_name', 'author__last_name',
+        ],
+        author_field,
+    ),
+    'group': (['group_id', 'group__slug', 'group__title'], group_field),
+    'image': (['image'], image_field),
+    'comment_count': (['comment_count'], lambda row: row['comment_count']),
+}
+# The full text is only sent by the post endpoint, unless asked for.
+LIST_FIELDS = [name for name in POST_FIELDS if name != 'text']
+DETAIL_FIELDS = list(POST_FIELDS)
+
+
+class BadRequest(Exception):
+    pass
+
+
+def respond(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def error(status, detail):
+    return respond({'detail': detail}, status)
+
+
+def requested_fields(request, default):
+    names = list(dict.fromkeys(
+        name.strip()
+        for name in request.GET.get('fields', '').split(',')
+        if name.strip()
+    ))
+    if not names:
+        return default
+    unknown = [name for name in names if name not in POST_FIELDS]
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}')
+    return names
+
+
+def post_rows(posts, fields):
+    """``posts.values()`` with the lookups of ``fields``, and
+    ``id`` and ``pub_date`` the cursors are made of.
+    """
+
+    lookups = ['id', 'pub_date']
+    for name in fields:
+        lookups += POST_FIELDS[name][0]
+    return posts.values(*dict.fromkeys(lookups))
+
+
+def serialize(row, fields):
+    return {name: POST_FIELDS[name][1](row) for name in fields}
+
+
+def page_response(page, rows, fields):
+    return respond({
+        'results': [serialize(row, fields) for row in rows],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+def api_view(view):
+    """Client errors of the API views as JSON."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except (BadRequest, InvalidCursor) as exception:
+            return error(400, str(exception))
+    return wrapped
+
+
+def post_list(request, posts):
+    fields = requested_fields(request, LIST_FIELDS)
+    paginator = CursorPaginator(
+        post_rows(posts, fields), settings.API_PAGE_SIZE
+    )
+    page = paginator.page(request.GET.get('cursor'))
+    return page_response(page, page, fields)
+
+
+@conditional.conditional_page(conditional.index_scopes)
+@api_view
+def posts(request):
+    return post_list(request, Post.objects.feed())
+
+
+@conditional.conditional_page(conditional.group_scopes)
+@api_view
+def group_posts(request, slug):
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return error(404, 'Сообщество не найдено')
+    return post_list(request, group.posts.feed())
+
+
+@conditional.conditional_page(conditional.profile_scopes)
+@api_view
+def profile_posts(request, username):
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        return error(404, 'Пользователь не найден')
+    return post_list(request, user.posts.feed())
+
+
+@conditional.conditional_page(conditional.post_scopes)
+@api_view
+def post(request, username, post_id):
+    fields = requested_fields(request, DETAIL_FIELDS)
+    row = post_rows(
+        Post.objects.feed(full_text=True).filter(
+            author__username=username, id=post_id
+        ),
+        fields,
+    ).first()
+    if row is None:
+        return error(404, 'Пост не найден')
+    return respond(serialize(row, fields))
+
+
+@conditional.conditional_page(conditional.post_scopes)
+@api_view
+def post_comments(request, username, post_id):
+    if not Post.objects.filter(
+        author__username=username, id=post_id
+    ).exists():
+        return error(404, 'Пост не найден')
+    paginator = CursorPaginator(
+        Comment.objects.filter(post_id=post_id).values(
+            'id', 'created', 'text',
+            'author_id', 'author__username',
+            'author__first_name', 'author__last_name',
+        ),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+    page = paginator.page(request.GET.get('cursor'))
+    return respond({
+        'results': [
+            {
+                'id': row['id'],
+                'author': author_field(row),
+                'text': row['text'],
+                'created': row['created'],
+            }
+            for row in page
+        ],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+
+
+@api_view
+def follow_posts(request):
+    """``follow_index`` by cursors. Without authors fanned out on
+    read, the cursor walks the timeline itself, and the posts of a
+    page are read by their ids.
+    """
+
+    if not request.user.is_authenticated:
+        return error(401, 'Нужно войти на сайт')
+    fields = requested_fields(request, LIST_FIELDS)
+    cursor = request.GET.get('cursor')
+    authors = timeline.read_authors(request.user)
+    if authors:
+        feed = timeline.follow_feed(
+            request.user, authors, post_rows(Post.objects.feed(), fields)
+        )
+        paginator = timeline.FollowFeedPaginator(
+            feed, settings.API_PAGE_SIZE
+        )
+        page = paginator.page(cursor)
+        return page_response(page, page, fields)
+    paginator = CursorPaginator(
+        TimelineEntry.objects.filter(user=request.user).values(
+            'post', 'pub_date'
+        ),
+        settings.API_PAGE_SIZE,
+        ordering=('-pub_date', '-post'),
+    )
+    page = paginator.page(cursor)
+    ids = [entry['post'] for entry in page]
+    rows = {
+        row['id']: row
+        for row in post_rows(Post.objects.feed().filter(pk__in=ids), fields)
+    }
+    return page_response(
+        page, [rows[pk] for pk in ids if pk in rows], fields
+    )
+
+
+urlpatterns = [
+    path('posts/', posts, name='api_posts'),
+    path('follow/posts/', follow_posts, name='api_follow_posts'),
+    path('groups/<slug:slug>/posts/', group_posts, name='api_group_posts'),
+    path(
+        'users/<str:username>/posts/',
+        profile_posts,
+        name='api_profile_posts'
+    ),
+    path(
+        'users/<str:username>/posts/<int:post_id>/',
+        post,
+        name='api_post'
+    ),
+    path(
+        'users/<str:username>/posts/<int:post_id>/comments/',
+        post_comments,
+        name='api_post_comments'
+    ),
+]
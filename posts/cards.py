@@ -0,0 +1,92 @@
+"""Versioned cache of rendered ``includes/post_item.html`` cards.
+
+A card is cached whole under the post id and its card version, and
+whether the viewer is the author, who also gets the edit button. The
+card version combines the versions of the post (the time of its last
+change), of its author's name and of its group's title. Signals move
+them forward once an edit, a comment, a delete or a rename commits, so
+a stale card is never looked up again and simply expires. The views
+fetch the cards of a page with one cache round trip, the
+``{% post_card %}`` tag renders only the missing ones.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from yatube import replicas
+
+
+def version_key(scope):
+    """Key of a post id, ``user:<id>`` or ``group:<id>``."""
+    return f'post_card_version:{scope}'
+
+
+def touch(scope):
+    # After the commit: a card rendered from the old row in between
+    # must not be cached under the new version.
+    transaction.on_commit(
+        lambda: cache.set(version_key(scope), time.time_ns(), None)
+    )
+
+
+def card_keys(post):
+    keys = [version_key(post.pk), version_key(f'user:{post.author_id}')]
+    if post.group_id:
+        keys.append(version_key(f'group:{post.group_id}'))
+    return keys
+
+
+def forget(post_id):
+    cache.delete(version_key(post_id))
+
+
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+
+def fragment_key(post, full_text, is_author):
+    return (
+        f'post_card:{post.pk}:{post.card_version}:'
+        f'{int(full_text)}:{int(is_author)}'
+    )
+
+
+def is_author(user, post):
+    return bool(user and user.is_authenticated and user.pk == post.author_id)
+
+
+def attach_versions(posts, user=None, full_text=False):
+    """Set ``card_version`` on every post with one cache round trip.
+    A lost version is started afresh, never reused. Given the viewer,
+    the cached cards are fetched in one more round trip, as
+    ``card_html`` (``None`` on a miss). A post read from a replica that
+    may not have its latest version is left without one, so its card
+    is rendered but not cached.
+    """
+
+    posts = list(posts)
+    keys = [card_keys(post) for post in posts]
+    unique = list(dict.fromkeys(
+        key for post_keys in keys for key in post_keys
+    ))
+    versions = cache.get_many(unique)
+    missing = {key: time.time_ns() for key in unique if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    versioned = []
+    for post, post_keys in zip(posts, keys):
+        stamps = [versions[key] for key in post_keys]
+        if replicas.behind(max(stamps)):
+            continue
+        post.card_version = '.'.join(str(stamp) for stamp in stamps)
+        versioned.append(post)
+    if user is not None:
+        keys = [
+            fragment_key(post, full_text, is_author(user, post))
+            for post in versioned
+        ]
+        fragments = cache.get_many(keys)
+        for post, key in zip(versioned, keys):
+            post.card_html = fragments.get(key)
+    return posts
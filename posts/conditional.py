@@ -0,0 +1,141 @@
+"""Conditional GET for the feed and post pages.
+
+Every page depends on a few scopes: ``index``, ``group:<id>``,
+``user:<id>`` (a profile, its posts and counters) and ``post:<id>``.
+The signals in ``posts.signals`` move the version of a scope, kept in
+the cache like the card versions of ``posts.cards``, whenever something
+shown in it changes. The ETag of a page is a hash of its scope versions,
+the viewer and ``RELEASE``, so a 304 is answered from one cache round
+trip and at most one indexed lookup, before the view runs. A lost
+version is started afresh, which can only cost a full response.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from posts.models import Group, Post, User
+from yatube import replicas
+
+
+def version_key(scope):
+    return f'page_version:{scope}'
+
+
+def touch(*scopes):
+    # After the commit, as in posts.cards: a page rendered from the old
+    # rows in between must not be tagged with the new version.
+    keys = [version_key(scope) for scope in scopes if scope]
+    transaction.on_commit(
+        lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), None)
+    )
+
+
+def touch_post(post_id, *scopes):
+    """Touch a post, the pages that list it and ``scopes``."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if row is None:
+        touch('index', *scopes)
+        return
+    author_id, group_id = row
+    touch(
+        'index',
+        f'post:{post_id}',
+        f'user:{author_id}',
+        f'group:{group_id}' if group_id else None,
+        *scopes,
+    )
+
+
+def versions(scopes):
+    keys = [version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    stamps = [found[key] for key in keys]
+    # The page is cached and tagged with these versions: it must not be
+    # rendered from a replica without the commits behind them.
+    replicas.require(max(stamps))
+    return stamps
+
+
+def validators(request, scopes):
+    """``(etag, last_modified)`` of a page built from ``scopes``."""
+    if scopes is None:
+        return None, None
+    stamps = versions(scopes)
+    viewer = request.user.pk if request.user.is_authenticated else 0
+    digest = hashlib.md5(
+        repr((settings.RELEASE, viewer, scopes, stamps)).encode()
+    ).hexdigest()
+    last_modified = datetime.fromtimestamp(
+        max(stamps) // 10**9, timezone.utc
+    )
+    return digest, last_modified
+
+
+def index_scopes():
+    return ['index']
+
+
+def group_scopes(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return None if group_id is None else [f'group:{group_id}']
+
+
+def profile_scopes(username):
+    user_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return None if user_id is None else [f'user:{user_id}']
+
+
+def post_scopes(username, post_id):
+    author_id = Post.objects.filter(
+        pk=post_id, author__username=username
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [f'post:{post_id}', f'user:{author_id}']
+
+
+def conditional_page(scopes):
+    """Answer ``If-None-Match``/``If-Modified-Since`` with 304 from
+    the versions of ``scopes(**view_kwargs)``. The ETag and the
+    response depend on the user, hence ``Vary: Cookie``.
+    """
+
+    def page_validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            # Already looked up by posts.pagecache for anonymous visitors.
+            page_scopes = getattr(request, '_page_scopes', None)
+            request._page_validators = validators(
+                request, page_scopes or scopes(**kwargs)
+            )
+        return request._page_validators
+
+    def decorator(view):
+        wrapped = vary_on_cookie(condition(
+            etag_func=lambda *args, **kwargs: page_validators(
+                *args, **kwargs
+            )[0],
+            last_modified_func=lambda *args, **kwargs: page_validators(
+                *args, **kwargs
+            )[1],
+        )(view))
+        # Read by ``posts.pagecache``.
+        wrapped.page_scopes = scopes
+        return wrapped
+
+    return decorator
@@ -0,0 +1,103 @@
+"""RSS and Atom feeds of a group and of an author.
+
+A feed is the latest ``FEED_ITEMS`` posts, read along the same index as
+the group and profile pages, without the post bodies: an item shows
+``summary_html``. The views are ``conditional_page`` views on the scopes
+of those pages, so a poller gets a 304 until something is posted, and
+anonymous pollers share one render through ``posts.pagecache``.
+"""
+from html import unescape
+
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+from posts import conditional
+from posts.models import Group, Post, User
+
+
+class PostsFeed(Feed):
+    def posts(self, **filters):
+        return Post.objects.filter(**filters).select_related(
+            'author', 'group'
+        ).defer('text').order_by('-pub_date', '-id')[:settings.FEED_ITEMS]
+
+    def item_title(self, item):
+        return Truncator(unescape(strip_tags(item.summary_html))).chars(80)
+
+    def item_description(self, item):
+        return item.summary_html
+
+    def item_link(self, item):
+        return reverse('post', args=[item.author.username, item.pk])
+
+    def item_pubdate(self, item):
+        return item.pub_date
+
+    def item_author_name(self, item):
+        return item.author.username
+
+    def item_categories(self, item):
+        return [item.group.title] if item.group else []
+
+
+class GroupFeed(PostsFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, obj):
+        return f'{obj.title} | Yatube'
+
+    def link(self, obj):
+        return reverse('group_post', args=[obj.slug])
+
+    def description(self, obj):
+        return obj.description
+
+    def items(self, obj):
+        return self.posts(group=obj)
+
+
+class GroupAtomFeed(GroupFeed):
+    feed_type = Atom1Feed
+    subtitle = GroupFeed.description
+
+
+class AuthorFeed(PostsFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, obj):
+        return f'@{obj.username} | Yatube'
+
+    def link(self, obj):
+        return reverse('profile', args=[obj.username])
+
+    def description(self, obj):
+        return f'Записи @{obj.username}'
+
+    def items(self, obj):
+        return self.posts(author=obj)
+
+
+class AuthorAtomFeed(AuthorFeed):
+    feed_type = Atom1Feed
+    subtitle = AuthorFeed.description
+
+
+group_rss = conditional.conditional_page(conditional.group_scopes)(
+    GroupFeed()
+)
+group_atom = conditional.conditional_page(conditional.group_scopes)(
+    GroupAtomFeed()
+)
+author_rss = conditional.conditional_page(conditional.profile_scopes)(
+    AuthorFeed()
+)
+author_atom = conditional.conditional_page(conditional.profile_scopes)(
+    AuthorAtomFeed()
+)
@@ -1,4 +1,7 @@
 from django import forms
+from django.conf import settings
+
+from . import uploads
 from .models import Comment, Post
 
 
@@ -6,6 +9,23 @@ class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image',)
+        error_messages = {
+            'image': {
+                # An upload over POST_IMAGE_MAX_BYTES arrives empty.
+                'empty': 'Файл пустой или больше '
+                         f'{settings.POST_IMAGE_MAX_BYTES // 2**20} МБ.',
+            },
+        }
+
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        opened = getattr(image, 'image', None)
+        if opened is not None and not uploads.check_dimensions(opened):
+            raise forms.ValidationError(
+                'Изображение больше '
+                f'{settings.POST_IMAGE_MAX_PIXELS // 10**6} мегапикселей.'
+            )
+        return image
 
 
 class CommentForm(forms.ModelForm):
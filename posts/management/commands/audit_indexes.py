@@ -0,0 +1,82 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts.models import Comment, Follow, Post, User, UserStats
+from posts.paginator import CursorPaginator
+from posts.timeline import follow_feed
+
+PER_PAGE = 10
+
+# Plan lines that mean "read the whole table" or "sort in a temp table".
+BAD_PLAN = {
+    'sqlite': (
+        re.compile(r'\bSCAN (TABLE )?\S+$'),
+        re.compile(r'USE TEMP B-TREE'),
+    ),
+    'postgresql': (
+        re.compile(r'Seq Scan'),
+        re.compile(r'(^|->)\s*(Incremental )?Sort\s'),
+    ),
+}
+
+
+def feed_queries():
+    """The hot queries of the feed views, with placeholder ids."""
+    paginator = CursorPaginator(Post.objects.feed(), PER_PAGE)
+    some_date = Post._meta.get_field('pub_date').to_python(
+        '2021-01-01T00:00:00+00:00'
+    )
+    seek = paginator._seek([some_date, 1], True)
+    user = User(pk=1)
+    return {
+        'index': paginator.object_list[:PER_PAGE + 1],
+        'index (next page)': paginator.object_list.filter(
+            seek
+        )[:PER_PAGE + 1],
+        'group_posts': paginator.object_list.filter(
+            group_id=1
+        ).filter(seek)[:PER_PAGE + 1],
+        'profile': paginator.object_list.filter(
+            author_id=1
+        ).filter(seek)[:PER_PAGE + 1],
+        'follow_index': follow_feed(user)[:PER_PAGE],
+        'post_view comments': Comment.objects.filter(
+            post_id=1
+        ).order_by('created', 'id')[:PER_PAGE],
+        'follow probe': Follow.objects.filter(user=user, author_id=2),
+        'profile stats': UserStats.objects.filter(user=user),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет EXPLAIN для запросов лент и падает, если какой-то '
+        'из них читает таблицу целиком или сортирует во временной таблице.'
+    )
+
+    def handle(self, *args, **options):
+        patterns = BAD_PLAN.get(connection.vendor)
+        if patterns is None:
+            raise CommandError(
+                f'База {connection.vendor} не поддерживается'
+            )
+        failed = []
+        for name, queryset in feed_queries().items():
+            plan = queryset.explain()
+            bad = [
+                line for line in plan.splitlines()
+                if any(pattern.search(line) for pattern in patterns)
+            ]
+            if bad:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}:'))
+                self.stdout.write('\n'.join(f'    {line}' for line in bad))
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'{name}:\n{plan}')
+        if failed:
+            raise CommandError(
+                'Запросы без подходящего индекса: ' + ', '.join(failed)
+            )
+        self.stdout.write(self.style.SUCCESS('Все запросы лент по индексам'))
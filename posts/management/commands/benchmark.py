@@ -0,0 +1,211 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, F
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Group, Post, User
+from posts.uploads import peak_rss_kb
+from yatube.metrics import Timing
+
+
+def feed_urls():
+    """Name, URL and reader of every benchmarked view, picked
+    from the heaviest rows: the biggest group, the most followed
+    author, the user who follows the most authors.
+    """
+
+    urls = [('index', reverse('index'), None)]
+    group = Group.objects.annotate(
+        total=Count('posts')
+    ).order_by('-total').first()
+    if group:
+        urls.append((
+            'group_posts', reverse('group_post', args=[group.slug]), None
+        ))
+    author = User.objects.order_by(
+        F('stats__followers').desc(nulls_last=True), 'pk'
+    ).first()
+    post = Post.objects.filter(author=author).order_by('-pub_date').first()
+    if author:
+        urls.append((
+            'profile', reverse('profile', args=[author.username]), None
+        ))
+    if post:
+        urls.append((
+            'post_view',
+            reverse('post', args=[author.username, post.pk]),
+            None,
+        ))
+    reader = Follow.objects.values('user').annotate(
+        total=Count('pk')
+    ).order_by('-total').values_list('user', flat=True).first()
+    if reader:
+        urls.append((
+            'follow_index', reverse('follow_index'),
+            User.objects.get(pk=reader),
+        ))
+    return urls
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет ленты (index, group_posts, profile, post_view, '
+        'follow_index) через тестовый клиент на текущей базе, пишет '
+        'задержки, число запросов к БД и пик памяти в JSON и сравнивает '
+        'с базовой линией.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько запросов на каждое представление.',
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.',
+        )
+        parser.add_argument(
+            '--page-cache', action='store_true',
+            help='Отдавать анонимные страницы из кеша страниц, как на '
+                 'сайте. По умолчанию меряется рендер представлений.',
+        )
+        parser.add_argument('--output', help='Куда записать результат.')
+        parser.add_argument(
+            '--compare', help='Базовая линия для сравнения (JSON).',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95 относительно базовой линии.',
+        )
+
+    def handle(self, *args, **options):
+        urls = feed_urls()
+        if len(urls) < 5:
+            raise CommandError(
+                'Недостаточно данных, сначала manage.py seed_benchmark.'
+            )
+        result = {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connections['default'].vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'page_cache': options['page_cache'],
+            'dataset': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'views': {},
+        }
+        # A client loads the middleware on its first request.
+        with override_settings(PAGE_CACHE=options['page_cache']):
+            for name, url, reader in urls:
+                client = Client()
+                if reader is not None:
+                    client.force_login(reader)
+                result['views'][name] = self.measure(
+                    client, url, options['requests'], options['cold']
+                )
+        result['peak_rss_kb'] = peak_rss_kb()
+        self.print_table(result['views'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, indent=2, ensure_ascii=False)
+        if options['compare']:
+            self.compare(result, options['compare'], options['tolerance'])
+
+    def get(self, client, url, cold):
+        if cold:
+            cache.clear()
+        timing = Timing()
+        # Every alias: the feeds may be read from the replicas.
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url}: {response.status_code}')
+        return elapsed * 1000, timing.queries
+
+    def measure(self, client, url, requests, cold):
+        self.get(client, url, cold)  # warm-up
+        latencies, queries = [], []
+        for _ in range(requests):
+            elapsed, count = self.get(client, url, cold)
+            latencies.append(elapsed)
+            queries.append(count)
+        # Python allocations of one more request, measured apart:
+        # tracemalloc slows everything down.
+        tracemalloc.start()
+        self.get(client, url, cold)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'url': url,
+            'p50_ms': round(statistics.median(latencies), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'queries': max(queries),
+            'peak_kb': peak // 1024,
+        }
+
+    def print_table(self, views):
+        self.stdout.write(
+            f'{"view":<14}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}'
+            f'{"queries":>9}{"peak KiB":>10}'
+        )
+        for name, row in views.items():
+            self.stdout.write(
+                f'{name:<14}{row["p50_ms"]:>10}{row["p95_ms"]:>10}'
+                f'{row["p99_ms"]:>10}{row["queries"]:>9}{row["peak_kb"]:>10}'
+            )
+
+    def compare(self, result, path, tolerance):
+        """Fail on more queries than the baseline or on a p95
+        more than ``tolerance`` above it.
+        """
+
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = []
+        for name, old in baseline['views'].items():
+            new = result['views'].get(name)
+            if new is None:
+                regressions.append(f'{name}: нет в результате')
+                continue
+            if new['queries'] > old['queries']:
+                regressions.append(
+                    f'{name}: запросов {old["queries"]} -> {new["queries"]}'
+                )
+            if new['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {old["p95_ms"]} -> {new["p95_ms"]} мс'
+                )
+        if regressions:
+            raise CommandError(
+                'Регрессия относительно базовой линии:\n'
+                + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Не хуже базовой линии'
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры POST_THUMBNAIL_SIZES для картинок постов.'
+
+    def handle(self, *args, **options):
+        images = Post.objects.exclude(image='').exclude(
+            image__isnull=True
+        ).order_by('pk').values_list('pk', 'image')
+        built = failed = 0
+        for post_id, name in images.iterator():
+            try:
+                thumbnails.build(post_id, name)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено: {built}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,190 @@
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import (
+    OperationalError, close_old_connections, connections,
+)
+from django.test import Client, override_settings
+
+from posts.management.commands.benchmark import feed_urls, percentile
+from posts.models import Comment, Post, User
+
+# Workers are forked, as gunicorn does it.
+FORK = multiprocessing.get_context('fork')
+
+
+def work(urls, authors, posts, seconds, write_share, seed, results):
+    """One worker: feed pages and new posts or comments for
+    ``seconds``, like a sync gunicorn worker under load.
+    """
+
+    rng = random.Random(seed)
+    client = Client()
+    reads, writes, errors = [], [], 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        write = rng.random() < write_share
+        started = time.perf_counter()
+        try:
+            if not write:
+                client.get(rng.choice(urls))
+            elif rng.random() < 0.5:
+                Post.objects.create(
+                    text='Нагрузочный пост', author_id=rng.choice(authors)
+                )
+            else:
+                Comment.objects.create(
+                    text='Нагрузочный комментарий',
+                    author_id=rng.choice(authors),
+                    post_id=rng.choice(posts),
+                )
+        except OperationalError:
+            errors += 1
+            continue
+        finally:
+            # What the handler does at the end of every request, which
+            # the test client skips: close unless CONN_MAX_AGE keeps it.
+            close_old_connections()
+        (writes if write else reads).append(time.perf_counter() - started)
+    results.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite в профилях YATUBE_DB '
+        '(stock и tuned): несколько процессов, как воркеры gunicorn, '
+        'читают ленты и пишут посты и комментарии в копию текущей базы. '
+        'Нужны данные, см. manage.py seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profiles', nargs='+', default=['stock', 'tuned'],
+            choices=sorted(settings.DATABASE_PROFILES),
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=10,
+            help='Сколько длится прогон каждого профиля.',
+        )
+        parser.add_argument(
+            '--write-share', type=float, default=0.2,
+            help='Доля записей среди запросов.',
+        )
+        parser.add_argument('--output', help='Куда записать результат.')
+        # Run by the command itself, on a copy, with YATUBE_DB set.
+        parser.add_argument('--measure', action='store_true',
+                            help='Прогнать текущий профиль на текущей базе.')
+
+    def handle(self, *args, **options):
+        if options['measure']:
+            result = self.measure(options)
+            self.stdout.write(json.dumps(result))
+            return
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Поддерживается только SQLite.')
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for profile in options['profiles']:
+                path = os.path.join(directory, f'{profile}.sqlite3')
+                self.copy(path)
+                results[profile] = self.run(profile, path, options)
+        self.print_table(results)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+
+    def copy(self, path):
+        """A copy of default in rollback-journal mode: a profile
+        switches it to WAL itself, if it has to.
+        """
+
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(path)
+        with source, target:
+            source.backup(target)
+        target.execute('PRAGMA journal_mode = DELETE')
+        source.close()
+        target.close()
+
+    def run(self, profile, path, options):
+        self.stderr.write(f'{profile}: {options["seconds"]} с...')
+        completed = subprocess.run(
+            [
+                sys.executable,
+                os.path.join(settings.BASE_DIR, 'manage.py'),
+                'db_benchmark', '--measure',
+                '--workers', str(options['workers']),
+                '--seconds', str(options['seconds']),
+                '--write-share', str(options['write_share']),
+            ],
+            env={
+                **os.environ,
+                'YATUBE_DB': profile,
+                'YATUBE_DB_NAME': path,
+                'YATUBE_DB_REPLICAS': '',
+            },
+            stdout=subprocess.PIPE,
+            check=True,
+        )
+        return json.loads(completed.stdout.decode().splitlines()[-1])
+
+    def measure(self, options):
+        urls = [url for _, url, reader in feed_urls() if reader is None]
+        authors = list(User.objects.values_list('pk', flat=True)[:1000])
+        posts = list(Post.objects.values_list('pk', flat=True)[:1000])
+        if not urls or not authors or not posts:
+            raise CommandError(
+                'Недостаточно данных, сначала manage.py seed_benchmark.'
+            )
+        # A connection must not cross a fork.
+        connections.close_all()
+        results = FORK.Queue()
+        # Pages are rendered, not served by posts.pagecache.
+        with override_settings(PAGE_CACHE=False):
+            workers = [
+                FORK.Process(target=work, args=(
+                    urls, authors, posts, options['seconds'],
+                    options['write_share'], number, results,
+                ))
+                for number in range(options['workers'])
+            ]
+            for worker in workers:
+                worker.start()
+            collected = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+        reads = [value for row in collected for value in row[0]]
+        writes = [value for row in collected for value in row[1]]
+        seconds = options['seconds']
+        return {
+            'workers': options['workers'],
+            'reads_per_s': round(len(reads) / seconds, 1),
+            'writes_per_s': round(len(writes) / seconds, 1),
+            'read_p95_ms': round(percentile(reads, 0.95) * 1000, 2)
+            if reads else None,
+            'write_p95_ms': round(percentile(writes, 0.95) * 1000, 2)
+            if writes else None,
+            'locked': sum(row[2] for row in collected),
+        }
+
+    def print_table(self, results):
+        self.stdout.write(
+            f'{"profile":<10}{"reads/s":>10}{"writes/s":>10}'
+            f'{"read p95":>10}{"write p95":>11}{"locked":>8}'
+        )
+        for profile, row in results.items():
+            self.stdout.write(
+                f'{profile:<10}{row["reads_per_s"]:>10}'
+                f'{row["writes_per_s"]:>10}{row["read_p95_ms"]!s:>10}'
+                f'{row["write_p95_ms"]!s:>11}{row["locked"]:>8}'
+            )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает группы, посты, комментарии и подписки в JSON Lines '
+        'или CSV потоком, не загружая таблицы в память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки, по умолчанию стандартный вывод.',
+        )
+        parser.add_argument(
+            '--format', choices=tuple(export.FORMATS), default='jsonl',
+        )
+        parser.add_argument(
+            '--type', choices=export.TYPES, action='append', dest='types',
+            help='Выгружать только записи этого типа, можно повторять.',
+        )
+        parser.add_argument(
+            '--since',
+            help='Только посты и комментарии после этой даты (ISO 8601).',
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = export.parse_since(options['since'])
+            except ValueError as error:
+                raise CommandError(error)
+        types = options['types'] or export.TYPES
+        lines, _ = export.FORMATS[options['format']]
+        self.watermark = since
+        records = self.track(export.records(types, since))
+        if options['output'] == '-':
+            for line in lines(records):
+                self.stdout.write(line, ending='')
+        else:
+            with open(options['output'], 'w', newline='',
+                      encoding='utf-8') as output:
+                output.writelines(lines(records))
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено: {self.exported}. Следующий --since: '
+            f'{self.watermark.isoformat() if self.watermark else "-"}'
+        ))
+
+    def track(self, records):
+        """Count the records and remember the latest date."""
+        self.exported = 0
+        for record in records:
+            self.exported += 1
+            date = record.get('pub_date') or record.get('created')
+            if date and (self.watermark is None or date > self.watermark):
+                self.watermark = date
+            yield record
@@ -0,0 +1,433 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Max, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import cards, search, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+KINDS = ('post', 'comment', 'follow')
+
+
+def read_jsonl(stream):
+    for line, text in enumerate(stream, 1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except ValueError as error:
+                yield line, error
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, {
+            key: value for key, value in record.items() if value != ''
+        }
+
+
+def restore_dates(model, objects, dates, date_field):
+    """``bulk_create`` has stamped the ``auto_now_add`` field of the
+    rows of ``objects`` with the current time, the archived ``dates``
+    are written back with a few UPDATEs.
+    """
+
+    rows = list(zip(objects, dates))
+    # Three parameters a row, under the SQLite limit of 999.
+    for start in range(0, len(rows), 300):
+        part = rows[start:start + 300]
+        restored = Case(
+            *(
+                When(pk=obj.pk, then=Value(date, DateTimeField()))
+                for obj, date in part
+            ),
+            output_field=DateTimeField(),
+        )
+        model.objects.filter(
+            pk__in=[obj.pk for obj, _ in part]
+        ).update(**{date_field: restored})
+        for obj, date in part:
+            setattr(obj, date_field, date)
+
+
+class Lookup:
+    """``key -> pk`` cache, filled with one query per batch.
+    Unknown keys are remembered too, as ``None``.
+    """
+
+    def __init__(self, queryset, field, create=None):
+        self.queryset = queryset
+        self.field = field
+        self.create = create
+        self.known = {}
+
+    def load(self, keys):
+        missing = {key for key in keys if key not in self.known}
+        if not missing:
+            return
+        self.known.update(self.queryset.filter(
+            **{f'{self.field}__in': missing}
+        ).values_list(self.field, 'pk'))
+        missing -= self.known.keys()
+        if missing and self.create:
+            self.create(missing)
+            self.known.update(self.queryset.filter(
+                **{f'{self.field}__in': missing}
+            ).values_list(self.field, 'pk'))
+        self.known.update(dict.fromkeys(missing - self.known.keys()))
+
+    def __getitem__(self, key):
+        return self.known.get(key)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSON Lines или CSV '
+        'пачками через bulk_create. Миниатюры картинок строит '
+        'build_thumbnails.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с записями, "-" для стандартного ввода.',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла, по умолчанию по расширению.',
+        )
+        parser.add_argument(
+            '--type', choices=KINDS, dest='kind',
+            help='Тип записей без поля "type".',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк проверять и вставлять за раз.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Сколько записей загружать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов без пароля.',
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.default_kind = options['kind']
+        self.users = Lookup(
+            User.objects, 'username',
+            self.create_users if options['create_users'] else None,
+        )
+        self.groups = Lookup(Group.objects, 'slug')
+        self.imported = Counter()
+        self.skipped = 0
+        self.post_authors = set()
+        self.new_follows = []
+        self.explicit_ids = False
+        started = time.perf_counter()
+        path = options['path']
+        fmt = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl'
+        )
+        read = read_csv if fmt == 'csv' else read_jsonl
+        with self.open(path) as stream:
+            records = read(stream)
+            while True:
+                chunk = list(islice(records, options['chunk_size']))
+                if not chunk:
+                    break
+                with transaction.atomic():
+                    self.import_chunk(chunk)
+                self.report(started)
+            self.refresh_timelines()
+        if self.explicit_ids:
+            self.reset_sequences()
+        rows = sum(self.imported.values())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {self.imported["post"]}, '
+            f'комментариев: {self.imported["comment"]}, '
+            f'подписок: {self.imported["follow"]}, '
+            f'пропущено: {self.skipped}, '
+            f'{elapsed:.1f} с ({rows / elapsed:.0f} строк/с)'
+        ))
+
+    @contextmanager
+    def open(self, path):
+        if path == '-':
+            yield sys.stdin
+            return
+        try:
+            stream = open(path, newline='', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with stream:
+            yield stream
+
+    def report(self, started):
+        rows = sum(self.imported.values())
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'Загружено: {rows}, {rows / elapsed:.0f} строк/с'
+        )
+
+    def skip(self, line, reason):
+        self.skipped += 1
+        self.stderr.write(f'строка {line}: {reason}')
+
+    @staticmethod
+    def create_users(usernames):
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=name, password=password) for name in usernames],
+            ignore_conflicts=True,
+        )
+
+    def import_chunk(self, chunk):
+        by_kind = {kind: [] for kind in KINDS}
+        for line, record in chunk:
+            if not isinstance(record, dict):
+                self.skip(line, f'не разобрать запись: {record}')
+                continue
+            kind = record.get('type', self.default_kind)
+            if kind not in by_kind:
+                self.skip(line, f'неизвестный тип {kind!r}')
+                continue
+            by_kind[kind].append((line, record))
+        # Posts go first, so that comments may refer to them.
+        for kind in KINDS:
+            records = by_kind[kind]
+            for start in range(0, len(records), self.batch_size):
+                batch = records[start:start + self.batch_size]
+                getattr(self, f'import_{kind}s')(batch)
+
+    def parse(self, line, record, required, dates=()):
+        """Check the required fields, convert ids and dates.
+        Returns ``None`` after reporting a broken record.
+        """
+
+        missing = [name for name in required if not record.get(name)]
+        if missing:
+            self.skip(line, f'нет полей {", ".join(missing)}')
+            return None
+        record = dict(record)
+        try:
+            for name in ('id', 'post'):
+                if record.get(name) is not None:
+                    record[name] = int(record[name])
+            for name in dates:
+                value = record.get(name)
+                if not value:
+                    record[name] = timezone.now()
+                    continue
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError(f'некорректная дата {record[name]!r}')
+                if timezone.is_naive(value):
+                    value = timezone.make_aware(value, timezone.utc)
+                record[name] = value
+        except (TypeError, ValueError) as error:
+            self.skip(line, error)
+            return None
+        return record
+
+    def existing_ids(self, model, records):
+        ids = [record['id'] for _, record in records if record.get('id')]
+        return set(model.objects.filter(pk__in=ids).values_list(
+            'pk', flat=True
+        ))
+
+    def import_posts(self, batch):
+        batch = [
+            (line, record) for line, record in (
+                (line, self.parse(line, record, ('author', 'text'),
+                                  dates=('pub_date',)))
+                for line, record in batch
+            ) if record is not None
+        ]
+        self.users.load(record['author'] for _, record in batch)
+        self.groups.load(
+            record['group'] for _, record in batch if record.get('group')
+        )
+        existing = self.existing_ids(Post, batch)
+        posts = []
+        for line, record in batch:
+            author_id = self.users[record['author']]
+            group_id = self.groups[record.get('group')]
+            if record.get('id') in existing:
+                self.skip(line, f'пост {record["id"]} уже есть')
+            elif author_id is None:
+                self.skip(line, f'нет автора {record["author"]!r}')
+            elif record.get('group') and group_id is None:
+                self.skip(line, f'нет группы {record["group"]!r}')
+            else:
+                posts.append(Post(
+                    id=record.get('id'),
+                    text=record['text'],
+                    author_id=author_id,
+                    group_id=group_id,
+                    pub_date=record['pub_date'],
+                    image=record.get('image'),
+                ))
+        self.create(Post, posts, 'pub_date')
+        self.index(search.POSTS, posts)
+        self.bump(Counter(post.author_id for post in posts), 'posts')
+        self.post_authors.update(post.author_id for post in posts)
+        self.imported['post'] += len(posts)
+
+    def import_comments(self, batch):
+        batch = [
+            (line, record) for line, record in (
+                (line, self.parse(line, record, ('post', 'author', 'text'),
+                                  dates=('created',)))
+                for line, record in batch
+            ) if record is not None
+        ]
+        self.users.load(record['author'] for _, record in batch)
+        posts = set(Post.objects.filter(
+            pk__in=[record['post'] for _, record in batch]
+        ).values_list('pk', flat=True))
+        existing = self.existing_ids(Comment, batch)
+        comments = []
+        for line, record in batch:
+            author_id = self.users[record['author']]
+            if record.get('id') in existing:
+                self.skip(line, f'комментарий {record["id"]} уже есть')
+            elif author_id is None:
+                self.skip(line, f'нет автора {record["author"]!r}')
+            elif record['post'] not in posts:
+                self.skip(line, f'нет поста {record["post"]}')
+            else:
+                comments.append(Comment(
+                    id=record.get('id'),
+                    post_id=record['post'],
+                    author_id=author_id,
+                    text=record['text'],
+                    created=record['created'],
+                ))
+        self.create(Comment, comments, 'created')
+        self.index(search.COMMENTS, comments)
+        self.bump(Counter(comment.author_id for comment in comments),
+                  'comments')
+        for post_id in {comment.post_id for comment in comments}:
+            cards.touch(post_id)
+        self.imported['comment'] += len(comments)
+
+    def import_follows(self, batch):
+        batch = [
+            (line, record) for line, record in (
+                (line, self.parse(line, record, ('user', 'author')))
+                for line, record in batch
+            ) if record is not None
+        ]
+        self.users.load(
+            name for _, record in batch
+            for name in (record['user'], record['author'])
+        )
+        pairs = {}
+        for line, record in batch:
+            pair = (self.users[record['user']], self.users[record['author']])
+            if None in pair:
+                self.skip(line, 'нет пользователя или автора')
+            elif pair[0] == pair[1]:
+                self.skip(line, 'подписка на себя')
+            elif pair in pairs:
+                self.skip(line, 'повтор подписки')
+            else:
+                pairs[pair] = line
+        for pair in Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id'):
+            if pair in pairs:
+                self.skip(pairs.pop(pair), 'подписка уже есть')
+        follows = [
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        ]
+        Follow.objects.bulk_create(follows)
+        self.bump(Counter(follow.user_id for follow in follows), 'following')
+        self.bump(Counter(follow.author_id for follow in follows),
+                  'followers')
+        self.new_follows.extend(follows)
+        self.imported['follow'] += len(follows)
+
+    def create(self, model, objects, date_field):
+        """``bulk_create`` with the archived dates kept and the new
+        primary keys set on ``objects``.
+        """
+
+        if not objects:
+            return
+        dates = [getattr(obj, date_field) for obj in objects]
+        explicit = [obj.pk for obj in objects if obj.pk is not None]
+        self.explicit_ids = self.explicit_ids or bool(explicit)
+        last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+        model.objects.bulk_create(objects)
+        implicit = [obj for obj in objects if obj.pk is None]
+        if implicit:
+            # Not returned on SQLite, but the new keys are the ones
+            # past last_pk, in order: the chunk's transaction keeps
+            # other writers out.
+            new_pks = model.objects.filter(pk__gt=last_pk).exclude(
+                pk__in=explicit
+            ).order_by('pk').values_list('pk', flat=True)
+            for obj, pk in zip(implicit, new_pks):
+                obj.pk = pk
+        restore_dates(model, objects, dates, date_field)
+
+    @staticmethod
+    def index(index, objects):
+        """Add new rows to the search index."""
+        if objects and search.enabled():
+            index.add_many((obj.pk, obj.text) for obj in objects)
+
+    @staticmethod
+    def reset_sequences():
+        """Explicit ids leave the PostgreSQL sequences behind, they
+        are reset as ``sqlsequencereset`` does. A no-op on SQLite.
+        """
+
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    @staticmethod
+    def bump(counts, counter):
+        """What the ``post_save`` signals would have done."""
+        for user_id, delta in counts.items():
+            UserStats.bump(user_id, **{counter: delta})
+
+    def refresh_timelines(self):
+        """Deliver the imported posts to the followers of their
+        authors, as ``fan_out`` does for a single post, and the
+        earlier posts to the imported follows. Each follow is
+        backfilled once, after all chunks are in.
+        """
+
+        authors = sorted(self.post_authors)
+        for start in range(0, len(authors), self.batch_size):
+            follows = Follow.objects.filter(
+                author_id__in=authors[start:start + self.batch_size]
+            ).order_by('pk')
+            for follow in follows.iterator():
+                timeline.backfill(follow)
+        # Followed authors without imported posts are left.
+        for follow in self.new_follows:
+            if follow.author_id not in self.post_authors:
+                timeline.backfill(follow)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = 'Заново строит поисковые индексы постов и комментариев.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько записей индексировать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('Полнотекстовый индекс есть только в SQLite.')
+        chunk_size = options['chunk_size']
+        indexes = ((Post, search.POSTS), (Comment, search.COMMENTS))
+        for model, index in indexes:
+            rows = model.objects.order_by('pk').values_list('pk', 'text')
+            indexed = 0
+            with transaction.atomic():
+                index.clear()
+                chunk = []
+                for row in rows.iterator(chunk_size=chunk_size):
+                    chunk.append(row)
+                    if len(chunk) == chunk_size:
+                        index.add_many(chunk)
+                        indexed += len(chunk)
+                        chunk = []
+                index.add_many(chunk)
+                indexed += len(chunk)
+            self.stdout.write(self.style.SUCCESS(
+                f'{index.table}: {indexed}'
+            ))
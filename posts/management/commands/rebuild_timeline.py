@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заново заполняет ленты подписок TimelineEntry по Follow.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Пересобрать ленту только этого пользователя.',
+        )
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('pk')
+        entries = TimelineEntry.objects.all()
+        if options['user']:
+            follows = follows.filter(user__username=options['user'])
+            entries = entries.filter(user__username=options['user'])
+        entries.delete()
+        rebuilt = 0
+        for follow in follows.iterator():
+            timeline.backfill(follow)
+            rebuilt += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {rebuilt}'
+        ))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import User, UserStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики UserStats и исправляет расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей пересчитывать за один запрос.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не записывать.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        users = User.objects.order_by('pk').values(
+            'pk', **UserStats.count_expressions()
+        )
+        checked = created = fixed = 0
+        last_pk = None
+        while True:
+            chunk = users if last_pk is None else users.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1]['pk']
+            checked += len(chunk)
+            stored = UserStats.objects.in_bulk([row['pk'] for row in chunk])
+            missing, drifted = [], []
+            for row in chunk:
+                exact = UserStats.exact_counts(row)
+                stats = stored.get(row['pk'])
+                if stats is None:
+                    missing.append(UserStats(user_id=row['pk'], **exact))
+                    continue
+                diff = {
+                    name: (getattr(stats, name), value)
+                    for name, value in exact.items()
+                    if getattr(stats, name) != value
+                }
+                if diff:
+                    self.stdout.write(f'user {row["pk"]}: {diff}')
+                    for name, (_, value) in diff.items():
+                        setattr(stats, name, value)
+                    drifted.append(stats)
+            created += len(missing)
+            fixed += len(drifted)
+            if not options['dry_run']:
+                UserStats.objects.bulk_create(missing)
+                UserStats.objects.bulk_update(drifted, UserStats.COUNTERS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено: {checked}, создано: {created}, исправлено: {fixed}'
+        ))
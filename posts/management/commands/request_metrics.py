@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from yatube import metrics
+
+COLUMNS = ('total_ms', 'db_ms', 'template_ms', 'queries', 'bytes')
+
+
+def cell(values):
+    if not values:
+        return '-'
+    return '/'.join(str(values[label]) for label in metrics.PERCENTILES)
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает p50/p95/p99 запросов по представлениям, собранные '
+        'воркерами в общем кеше за последние окна REQUEST_METRICS_WINDOW.'
+    )
+
+    def handle(self, *args, **options):
+        report = metrics.report()
+        if not report:
+            self.stdout.write(
+                'Нет данных. Воркеры делятся метриками через кеш, '
+                'нужен YATUBE_CACHE=shared или tiered.'
+            )
+            return
+        self.stdout.write(' '.join(
+            [f'{"view":<24}', f'{"requests":>8}']
+            + [f'{column:>22}' for column in COLUMNS]
+        ))
+        for name, row in report.items():
+            self.stdout.write(' '.join(
+                [f'{name:<24}', f'{row["requests"]:>8}']
+                + [f'{cell(row.get(column)):>22}' for column in COLUMNS]
+            ))
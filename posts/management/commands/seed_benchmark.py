@@ -0,0 +1,204 @@
+import random
+import time
+from bisect import bisect
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts import search
+from posts.management.commands.import_posts import restore_dates
+from posts.models import Comment, Follow, Group, Post, User
+
+PREFIX = 'bench_'
+
+WORDS = (
+    'пост лента новости друзья кошка собака город лето зима утро вечер '
+    'книга музыка фильм поездка работа проект код питон джанго база '
+    'запрос индекс кеш страница подписка автор группа комментарий фото '
+    'море горы лес река дом семья праздник спорт бег велосипед кофе чай'
+).split()
+
+
+class Zipf:
+    """Draws ``0..n-1``, ``k`` with a weight of ``1 / (k + 1) ** s``:
+    a few very popular items and a long tail.
+    """
+
+    def __init__(self, n, s, rng):
+        self.cumulative = list(accumulate(
+            1 / (rank + 1) ** s for rank in range(n)
+        ))
+        self.rng = rng
+
+    def __call__(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return min(bisect(self.cumulative, point),
+                   len(self.cumulative) - 1)
+
+
+def ascending(count, rng):
+    """``count`` uniform draws from ``[0, 1)`` in ascending order,
+    one at a time: each is the least of the draws left, spread over
+    the rest of the interval.
+    """
+
+    point = 0.0
+    for left in range(count, 0, -1):
+        point = 1 - (1 - point) * rng.random() ** (1 / left)
+        yield point
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для benchmark: '
+        'пользователи, группы, посты и комментарии со степенным '
+        'распределением авторов и подписок. Для нагрузочного набора, '
+        'например: --users 100000 --posts 5000000 --follows 2000000.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты постов.',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель степенного распределения авторов.',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError('Данные для benchmark уже есть в базе.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        started = time.perf_counter()
+        users = self.seed_users(options['users'])
+        groups = self.seed_groups(options['groups'])
+        authors = Zipf(len(users), options['skew'], self.rng)
+        posts = self.seed_posts(
+            options['posts'], users, groups, authors, options['days']
+        )
+        self.seed_comments(options['comments'], users, posts)
+        self.seed_follows(options['follows'], users, authors)
+        self.stdout.write(
+            f'Данные созданы за {time.perf_counter() - started:.1f} с, '
+            'пересчитываю счетчики, ленты и поиск'
+        )
+        call_command('reconcile_stats', stdout=self.stdout)
+        call_command('rebuild_timeline', stdout=self.stdout)
+        if search.enabled():
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def insert(self, model, objects, date_field=None):
+        """``bulk_create`` in batches, one transaction per batch.
+        The objects must have their ids for ``date_field`` to be kept.
+        """
+
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) == self.batch_size:
+                self.insert_batch(model, batch, date_field)
+                batch = []
+        self.insert_batch(model, batch, date_field)
+
+    @staticmethod
+    def insert_batch(model, batch, date_field):
+        with transaction.atomic():
+            if date_field:
+                dates = [getattr(obj, date_field) for obj in batch]
+            model.objects.bulk_create(batch)
+            if date_field:
+                restore_dates(model, batch, dates, date_field)
+
+    def text(self, low, high):
+        length = self.rng.randint(low, high)
+        return ' '.join(self.rng.choices(WORDS, k=length))
+
+    def seed_users(self, count):
+        password = make_password(None)
+        self.insert(User, (
+            User(username=f'{PREFIX}{number}', password=password)
+            for number in range(count)
+        ))
+        # Position in the list is the popularity rank.
+        by_name = dict(User.objects.filter(
+            username__startswith=PREFIX
+        ).values_list('username', 'pk'))
+        return [by_name[f'{PREFIX}{number}'] for number in range(count)]
+
+    def seed_groups(self, count):
+        self.insert(Group, (
+            Group(
+                title=f'Группа {number}',
+                slug=f'{PREFIX}group_{number}',
+                description=self.text(5, 15),
+            )
+            for number in range(count)
+        ))
+        return list(Group.objects.filter(
+            slug__startswith=PREFIX
+        ).values_list('pk', flat=True))
+
+    def seed_posts(self, count, users, groups, authors, days):
+        first = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        span = timedelta(days=days).total_seconds()
+        # Ids grow with the dates, as they do on a live site.
+        self.insert(Post, (
+            Post(
+                id=first + number,
+                text=self.text(5, 60),
+                author_id=users[authors()],
+                group_id=(
+                    self.rng.choice(groups)
+                    if groups and self.rng.random() < 0.3 else None
+                ),
+                pub_date=self.now - timedelta(seconds=span * (1 - offset)),
+            )
+            for number, offset in enumerate(ascending(count, self.rng))
+        ), date_field='pub_date')
+        return first, first + count
+
+    def seed_comments(self, count, users, posts):
+        first, end = posts
+        if first == end:
+            return
+        self.insert(Comment, (
+            Comment(
+                post_id=self.rng.randrange(first, end),
+                author_id=self.rng.choice(users),
+                text=self.text(2, 20),
+                created=self.now,
+            )
+            for _ in range(count)
+        ))
+
+    def seed_follows(self, count, users, authors):
+        pairs = set()
+        attempts = 0
+        while len(pairs) < count and attempts < count * 10:
+            attempts += 1
+            user, author = self.rng.choice(users), users[authors()]
+            if user != author:
+                pairs.add((user, author))
+        self.insert(Follow, (
+            Follow(user_id=user, author_id=author)
+            for user, author in sorted(pairs)
+        ))
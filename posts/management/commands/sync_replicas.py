@@ -0,0 +1,51 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from yatube import replicas
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу default в реплики DATABASE_REPLICAS (файлы SQLite '
+        'из YATUBE_DB_REPLICAS), чтобы проверить чтение с реплик локально. '
+        'С --interval повторяет копирование, как отстающая репликация.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Копировать снова каждые N секунд, пока не остановят.',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы, см. YATUBE_DB_REPLICAS.')
+        for alias in [*settings.DATABASE_REPLICAS, 'default']:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f'{alias}: поддерживается только SQLite.')
+        while True:
+            self.sync()
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self):
+        started = time.perf_counter()
+        source = connections['default']
+        source.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            target = connections[alias]
+            target.ensure_connection()
+            # Taken before the copy: every commit made before it is in.
+            stamp = time.time_ns()
+            # The backup API copies a consistent snapshot page by page,
+            # readers of the replica see the old or the new one.
+            source.connection.backup(target.connection)
+            replicas.mark_synced(alias, stamp)
+        self.stdout.write(
+            f'Реплик: {len(settings.DATABASE_REPLICAS)}, '
+            f'{time.perf_counter() - started:.2f} с'
+        )
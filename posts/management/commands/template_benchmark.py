@@ -0,0 +1,128 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Engine
+from django.template.backends.django import get_installed_libraries
+
+from posts import cards
+from posts.models import Post
+
+# name -> (page template, whether the views' prefetch runs first)
+PATHS = {
+    # Every card rendered, as on a cache miss.
+    'include': (
+        '{% for post in page %}'
+        '{% include "includes/post_item.html" %}'
+        '{% endfor %}',
+        False,
+    ),
+    # The layout before post_card: a {% cache %} fragment, one cache get
+    # per card, and the author's button and the date rendered every time.
+    'fragment': (
+        '{% load cache %}{% for post in page %}'
+        '{% cache 86400 benchmark_card post.id post.card_version %}'
+        '{% include "includes/post_item.html" %}'
+        '{% endcache %}'
+        '{% if user == post.author %}'
+        '{% url "post_edit" post.author.username post.id %}'
+        '{% endif %}'
+        '<small>{{ post.pub_date }}</small>'
+        '{% endfor %}',
+        False,
+    ),
+    'post_card': (
+        '{% load post_cards %}'
+        '{% for post in page %}{% post_card post %}{% endfor %}',
+        False,
+    ),
+    # What the feed views do: the cards of a page in one get_many.
+    'prefetched': (
+        '{% load post_cards %}'
+        '{% for post in page %}{% post_card post %}{% endfor %}',
+        True,
+    ),
+}
+
+
+def engine(cached):
+    loaders = settings.TEMPLATE_LOADERS
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    return Engine(
+        dirs=[settings.TEMPLATES_DIR],
+        loaders=loaders,
+        libraries=get_installed_libraries(),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Меряет время рендера одной карточки поста в ленте: через '
+        '{% include %}, с фрагментом {% cache %} (как до post_card), '
+        'тегом post_card и с '
+        'карточками страницы, полученными одним запросом к кешу, - '
+        'с кеширующим загрузчиком шаблонов и без него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=500,
+            help='Сколько раз отрисовать страницу в каждом варианте.',
+        )
+        parser.add_argument(
+            '--per-page', type=int, default=10,
+            help='Карточек на странице.',
+        )
+        parser.add_argument('--output', help='Куда записать результат.')
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.feed()[:options['per_page']])
+        if not posts:
+            raise CommandError(
+                'Нет постов, сначала manage.py seed_benchmark.'
+            )
+        user = AnonymousUser()
+        result = {}
+        for loader, cached in (('plain', False), ('cached', True)):
+            for path, (source, prefetch) in PATHS.items():
+                result[f'{loader}/{path}'] = self.measure(
+                    engine(cached), source, prefetch, posts, user,
+                    options['pages'],
+                )
+        self.print_table(result)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, indent=2)
+
+    def measure(self, engine, source, prefetch, posts, user, pages):
+        page_template = engine.from_string(source)
+
+        def render():
+            for post in posts:
+                post.__dict__.pop('card_html', None)
+            started = time.perf_counter()
+            # The views attach the versions in any case.
+            cards.attach_versions(posts, user if prefetch else None)
+            page_template.render(Context({'page': posts, 'user': user}))
+            return time.perf_counter() - started
+
+        render()  # fills the card cache
+        timings = [render() for _ in range(pages)]
+        per_card = [timing / len(posts) * 10 ** 6 for timing in timings]
+        return {
+            'cards': len(posts),
+            'median_us_per_card': round(statistics.median(per_card), 1),
+            'min_us_per_card': round(min(per_card), 1),
+        }
+
+    def print_table(self, result):
+        self.stdout.write(f'{"variant":<26}{"µs/card":>10}{"min":>10}')
+        for name, row in result.items():
+            self.stdout.write(
+                f'{name:<26}{row["median_us_per_card"]:>10}'
+                f'{row["min_us_per_card"]:>10}'
+            )
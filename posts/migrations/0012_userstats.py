@@ -0,0 +1,30 @@
+# Generated by Django 2.2.6 on 2026-10-17 03:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20210404_1007'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.IntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.IntegerField(default=0, verbose_name='Подписан')),
+                ('posts', models.IntegerField(default=0, verbose_name='Записей')),
+                ('comments', models.IntegerField(default=0, verbose_name='Комментариев')),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pub_date',)},
+        ),
+    ]
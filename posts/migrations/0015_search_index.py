@@ -0,0 +1,183 @@
+import re
+
+from django.db import migrations
+
+# A frozen copy of posts.stemmer: the migration must keep working when
+# the module changes or goes away. manage.py rebuild_search_index
+# reindexes with the current stemmer.
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', 'вши', 'в'),
+    ('ывшись', 'ившись', 'ывши', 'ивши', 'ыв', 'ив'),
+)
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие',
+    'ые', 'ое', 'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым',
+    'ом', 'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'ете', 'йте', 'ешь', 'нно', 'ла', 'на', 'ли', 'ем',
+        'ло', 'но', 'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+    ),
+    (
+        'ейте', 'уйте', 'ила', 'ыла', 'ена', 'ите',
+        'или', 'ыли', 'ило', 'ыло', 'ено', 'ует', 'уют',
+        'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй', 'ил', 'ыл',
+        'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях',
+    'ев', 'ов', 'ие', 'ье', 'еи', 'ии', 'ей', 'ой', 'ий',
+    'ям', 'ем', 'ам', 'ом', 'ах', 'ях', 'ию', 'ью', 'ия',
+    'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы', 'ь', 'ю', 'я',
+)
+DERIVATIONAL = ('ость', 'ост')
+SUPERLATIVE = ('ейше', 'ейш')
+
+CYRILLIC = re.compile('[а-я]')
+WORD = re.compile(r'\w+')
+
+
+def _longest(word, endings):
+    """The longest of ``endings`` that ends ``word``, or ``''``."""
+    return max(
+        (ending for ending in endings if word.endswith(ending)),
+        key=len,
+        default='',
+    )
+
+
+def _remove_grouped(word, groups):
+    """Remove an ending of the two-group classes: endings of the
+    first group only count after «а» or «я».
+    """
+
+    first, second = groups
+    found = _longest(word, first + second)
+    if not found:
+        return word, False
+    rest = word[:-len(found)]
+    if found in first and not rest.endswith(('а', 'я')):
+        return word, False
+    return rest, True
+
+
+def _regions(word):
+    """Start of RV and R2, as in the Snowball definition."""
+    rv = r1 = r2 = len(word)
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index - 1] in VOWELS and word[index] not in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def _step_one(rv):
+    rv, removed = _remove_grouped(rv, PERFECTIVE_GERUND)
+    if removed:
+        return rv
+    reflexive = _longest(rv, REFLEXIVE)
+    if reflexive:
+        rv = rv[:-len(reflexive)]
+    adjective = _longest(rv, ADJECTIVE)
+    if adjective:
+        rv = rv[:-len(adjective)]
+        rv, _ = _remove_grouped(rv, PARTICIPLE)
+        return rv
+    rv, removed = _remove_grouped(rv, VERB)
+    if removed:
+        return rv
+    noun = _longest(rv, NOUN)
+    if noun:
+        rv = rv[:-len(noun)]
+    return rv
+
+
+def stem(word):
+    """Stem of a lowercase word."""
+    word = word.replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+    rv = _step_one(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r2_offset = max(r2_start - rv_start, 0)
+    derivational = _longest(rv[r2_offset:], DERIVATIONAL)
+    if derivational:
+        rv = rv[:-len(derivational)]
+    superlative = _longest(rv, SUPERLATIVE)
+    if superlative:
+        rv = rv[:-len(superlative)]
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif not superlative and rv.endswith('ь'):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def stem_text(text):
+    """Stems of all words of ``text``, separated by spaces."""
+    return ' '.join(stem(word) for word in WORD.findall(text.lower()))
+
+
+TABLES = {
+    'posts_post_fts': 'Post',
+    'posts_comment_fts': 'Comment',
+}
+
+
+def create_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table, model_name in TABLES.items():
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {table} USING fts5('
+            f"body, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        model = apps.get_model('posts', model_name)
+        rows = model.objects.order_by('pk').values_list('pk', 'text')
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, body) VALUES (%s, %s)',
+                (
+                    (pk, stem_text(text))
+                    for pk, text in rows.iterator(chunk_size=2000)
+                ),
+            )
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP TABLE {table}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
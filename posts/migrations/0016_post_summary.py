@@ -0,0 +1,49 @@
+# Generated by Django 2.2.6 on 2026-10-17 03:55
+
+from django.db import migrations
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+import posts.models
+
+CHUNK_SIZE = 2000
+
+
+def summarize(text, length):
+    # A frozen copy of posts.models.summarize: the migration must keep
+    # working when the model code changes.
+    return linebreaksbr(Truncator(text).chars(length), autoescape=True)
+
+
+def fill_summaries(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    length = Post._meta.get_field('summary_html').length
+    last_pk = 0
+    while True:
+        chunk = list(
+            Post.objects.filter(pk__gt=last_pk).order_by('pk').only(
+                'pk', 'text'
+            )[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for post in chunk:
+            post.summary_html = summarize(post.text, length)
+        Post.objects.bulk_update(chunk, ['summary_html'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='summary_html',
+            field=posts.models.SummaryField(length=400, source='text'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.6 on 2026-10-17 09:12
+
+from django.db import migrations
+from django.db.models.functions import Length
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
+
+CHUNK_SIZE = 2000
+
+SUMMARY_CUT = '<span class="summary-cut">…</span>'
+
+
+def summarize(text, length):
+    # A frozen copy of posts.models.summarize: the migration must keep
+    # working when the model code changes.
+    summary = Truncator(text).chars(length, truncate='')
+    html = linebreaksbr(summary, autoescape=True)
+    return html if summary == text else html + SUMMARY_CUT
+
+
+def mark_cut_summaries(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    length = Post._meta.get_field('summary_html').length
+    # Only a text longer than the summary is cut.
+    posts = Post.objects.annotate(
+        text_length=Length('text')
+    ).filter(text_length__gt=length)
+    last_pk = 0
+    while True:
+        chunk = list(
+            posts.filter(pk__gt=last_pk).order_by('pk').only(
+                'pk', 'text'
+            )[:CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        for post in chunk:
+            post.summary_html = summarize(post.text, length)
+        Post.objects.bulk_update(chunk, ['summary_html'])
+        last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_cut_summaries, migrations.RunPython.noop),
+    ]
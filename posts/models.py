@@ -1,8 +1,11 @@
 import textwrap
 
 from django.contrib.auth import get_user_model
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, OuterRef, Subquery, UniqueConstraint
+from django.db.models.functions import Coalesce
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
 
 User = get_user_model()
 
@@ -33,6 +36,119 @@ class Group(models.Model):
         return textwrap.shorten(self.title, 15)
 
 
+def count_subquery(model, field):
+    """``COUNT(*)`` of ``model`` rows whose ``field`` points
+    at the outer row, as a correlated subquery.
+    """
+
+    count = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(
+        count=Count('pk')
+    ).values('count')
+    return Coalesce(
+        Subquery(count, output_field=models.IntegerField()), 0
+    )
+
+
+# Ends a cut summary. The text is escaped, so it never contains a tag.
+SUMMARY_CUT = '<span class="summary-cut">…</span>'
+
+
+def summarize(text, length):
+    """The first ``length`` characters of ``text`` as HTML,
+    the way ``linebreaksbr`` shows the whole of it, and
+    ``SUMMARY_CUT`` after a text that goes on.
+    """
+
+    summary = Truncator(text).chars(length, truncate='')
+    html = linebreaksbr(summary, autoescape=True)
+    return html if summary == text else html + SUMMARY_CUT
+
+
+class SummaryField(models.TextField):
+    """Preview of the ``source`` field, kept by ``summarize``.
+    Computed in ``pre_save``, so ``save()`` and ``bulk_create`` keep it
+    up to date. ``QuerySet.update()`` and ``bulk_update()`` do not, see
+    ``PostQuerySet`` for the ones that do.
+    """
+
+    def __init__(self, *args, source='text', length=400, **kwargs):
+        self.source = source
+        self.length = length
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('default', '')
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.update(source=self.source, length=self.length)
+        del kwargs['editable'], kwargs['default']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = summarize(
+            getattr(model_instance, self.source), self.length
+        )
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+class PostQuerySet(models.QuerySet):
+    def summaries(self):
+        return [
+            field for field in self.model._meta.concrete_fields
+            if isinstance(field, SummaryField)
+        ]
+
+    def update(self, **kwargs):
+        """``update()`` that summarizes a new text along. A text
+        given as an expression has no preview to compute: it must
+        come with one, or it raises ``ValueError``.
+        """
+
+        for field in self.summaries():
+            if field.source not in kwargs or field.name in kwargs:
+                continue
+            text = kwargs[field.source]
+            if not isinstance(text, str):
+                raise ValueError(
+                    f'{field.source} обновляется выражением, '
+                    f'передайте и {field.name}'
+                )
+            kwargs[field.name] = summarize(text, field.length)
+        return super().update(**kwargs)
+
+    update.alters_data = True
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """``bulk_update()`` that writes the summaries of the updated
+        texts along.
+        """
+
+        fields = list(fields)
+        for field in self.summaries():
+            if field.source in fields and field.name not in fields:
+                for obj in objs:
+                    field.pre_save(obj, False)
+                fields.append(field.name)
+        return super().bulk_update(objs, fields, batch_size)
+
+    bulk_update.alters_data = True
+
+    def feed(self, full_text=False):
+        """Posts ready for ``includes/post_item.html``:
+        author and group are joined, comments are counted
+        by a subquery, so a page costs one query. The list
+        views show ``summary_html`` and leave the body unread.
+        """
+
+        posts = self.select_related('author', 'group').annotate(
+            comment_count=count_subquery(Comment, 'post')
+        )
+        return posts if full_text else posts.defer('text')
+
+
 class Post(models.Model):
     """Specified model by conditions.
     The main site model.
@@ -65,12 +181,43 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Выобор картинки'
     )
+    # Rendered preview for the feed cards, see PostQuerySet.feed.
+    summary_html = SummaryField(source='text', length=400)
+
+    objects = PostQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        post = super().from_db(db, field_names, values)
+        # The group the post was read with: an edit may move it out of
+        # the group, see posts.signals. Absent if deferred.
+        if 'group_id' in post.__dict__:
+            post.loaded_group_id = post.group_id
+        return post
+
+    @property
+    def summary_cut(self):
+        """Whether ``summary_html`` leaves part of the text out."""
+        return self.summary_html.endswith(SUMMARY_CUT)
 
     def __str__(self):
         return textwrap.shorten(self.text, 15)
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -91,6 +238,16 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+            # Admin date hierarchy.
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     """A model for subscribing to authors,
@@ -109,4 +266,135 @@ class Follow(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(fields=['user', 'author'], name='unique_follow')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='unique_follow'),
+        ]
+
+
+class UserStatsManager(models.Manager):
+    def for_user(self, user):
+        """The stats record of the user, created from exact
+        counts if it does not exist yet. The counts are only run
+        for a missing record, not on every lookup.
+        """
+
+        try:
+            return self.get(user=user)
+        except self.model.DoesNotExist:
+            pass
+        try:
+            with transaction.atomic():
+                return self.create(user=user, **self.model.count_for(user))
+        except IntegrityError:
+            # Created by a concurrent request in the meantime.
+            return self.get(user=user)
+
+
+class UserStats(models.Model):
+    """Denormalized counters for the profile card.
+    Kept up to date by the signals in ``posts.signals``,
+    drift is fixed by ``manage.py reconcile_stats``.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    followers = models.IntegerField(
+        verbose_name='Подписчиков',
+        default=0,
+    )
+    following = models.IntegerField(
+        verbose_name='Подписан',
+        default=0,
+    )
+    posts = models.IntegerField(
+        verbose_name='Записей',
+        default=0,
+    )
+    comments = models.IntegerField(
+        verbose_name='Комментариев',
+        default=0,
+    )
+
+    objects = UserStatsManager()
+
+    COUNTERS = ('followers', 'following', 'posts', 'comments')
+
+    def __str__(self):
+        return f'stats of {self.user_id}'
+
+    @staticmethod
+    def count_expressions():
+        """Exact counters as annotations over ``User``,
+        prefixed so they do not clash with its reverse relations.
+        """
+
+        return {
+            'stats_followers': count_subquery(Follow, 'author'),
+            'stats_following': count_subquery(Follow, 'user'),
+            'stats_posts': count_subquery(Post, 'author'),
+            'stats_comments': count_subquery(Comment, 'author'),
+        }
+
+    @classmethod
+    def exact_counts(cls, row):
+        return {name: row[f'stats_{name}'] for name in cls.COUNTERS}
+
+    @classmethod
+    def count_for(cls, user):
+        return cls.exact_counts(User.objects.filter(pk=user.pk).values(
+            **cls.count_expressions()
+        ).get())
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """Shift the counters in the database with ``F()``.
+        A missing record is left alone: it is built from exact
+        counts on first read.
+        """
+
+        cls.objects.filter(user_id=user_id).update(**{
+            name: models.F(name) + delta for name, delta in deltas.items()
+        })
+
+
+class TimelineEntry(models.Model):
+    """A post delivered to a follower's ``/follow/`` feed.
+    Written on publish (fan-out on write), see ``posts.timeline``.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='timeline_user_author_idx'
+            ),
+        ]
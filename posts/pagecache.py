@@ -0,0 +1,138 @@
+"""Full-page cache for anonymous visitors.
+
+``AnonymousPageCacheMiddleware`` sits in front of the session and CSRF
+middleware. A GET without a session cookie for a view decorated with
+``conditional.conditional_page`` is answered from the cache, keyed on
+the path and the ``cursor``/``page``/``format`` parameters. An entry
+remembers the page versions of ``posts.conditional`` it was rendered
+from. When a
+signal moves a version, or the entry is older than
+``PAGE_CACHE_TIMEOUT``, it is stale. One request takes a lock with
+``cache.add`` and renders the page again, while the others keep getting
+the stale copy for up to ``PAGE_CACHE_STALE``. A page that has never
+been rendered is waited for, up to ``PAGE_CACHE_LOCK_TIMEOUT``.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response
+
+from posts import conditional
+
+PARAMS = ('cursor', 'page', 'format', 'fields')
+HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Vary')
+POLL_INTERVAL = 0.05
+
+
+def page_key(request):
+    params = [(name, request.GET.get(name, '')) for name in PARAMS]
+    digest = hashlib.md5(
+        repr((request.get_host(), request.path, params)).encode()
+    ).hexdigest()
+    return f'page:{digest}'
+
+
+def serve(request, entry, state):
+    response = HttpResponse(entry['content'], status=entry['status'])
+    for name, value in entry['headers'].items():
+        response[name] = value
+    response['X-Page-Cache'] = state
+    return get_conditional_response(
+        request,
+        etag=entry['headers'].get('ETag'),
+        response=response,
+    )
+
+
+def fresh(entry, versions):
+    return (
+        entry is not None
+        and entry['versions'] == versions
+        and time.time() < entry['fresh_until']
+    )
+
+
+def cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        if not settings.PAGE_CACHE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        scopes = self.page_scopes(request)
+        if not scopes:
+            return self.get_response(request)
+        request._page_scopes = scopes
+        versions = conditional.versions(scopes)
+        key = page_key(request)
+        entry = cache.get(key)
+        if fresh(entry, versions):
+            return serve(request, entry, 'HIT')
+        return self.refresh(request, key, versions, entry)
+
+    def page_scopes(self, request):
+        """Scopes of a cacheable page, nothing for other requests."""
+        if (
+            request.method not in ('GET', 'HEAD')
+            or settings.SESSION_COOKIE_NAME in request.COOKIES
+        ):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        scopes = getattr(match.func, 'page_scopes', None)
+        scopes = scopes and scopes(**match.kwargs)
+        if scopes:
+            request.resolver_match = match
+        return scopes
+
+    def refresh(self, request, key, versions, entry):
+        lock = f'{key}:lock'
+        if cache.add(lock, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+            try:
+                return self.render(request, key, versions)
+            finally:
+                cache.delete(lock)
+        if entry is not None:
+            return serve(request, entry, 'STALE')
+        return self.wait(request, key)
+
+    def wait(self, request, key):
+        """First render of the page is in progress elsewhere."""
+        deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return serve(request, entry, 'HIT')
+        return self.get_response(request)
+
+    def render(self, request, key, versions):
+        response = self.get_response(request)
+        if cacheable(response):
+            cache.set(key, {
+                'versions': versions,
+                'fresh_until': time.time() + settings.PAGE_CACHE_TIMEOUT,
+                'status': response.status_code,
+                'content': response.content,
+                'headers': {
+                    name: response[name] for name in HEADERS
+                    if response.has_header(name)
+                },
+            }, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE)
+            response['X-Page-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,191 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+def pack_cursor(direction, values):
+    data = json.dumps([direction, values]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def unpack_cursor(cursor, length):
+    """``(direction, values)`` of a cursor made by ``pack_cursor``."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidCursor('Некорректный курсор')
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        raise InvalidCursor('Некорректный курсор')
+    if len(values) != length:
+        raise InvalidCursor('Некорректный курсор')
+    return direction, values
+
+
+def seek(fields, values, forward):
+    """Lexicographic "after/before this row" condition on ``fields``,
+    pairs of a name and whether it is descending.
+    The bound on the first field alone lets the database start
+    an index range scan right at the cursor.
+    """
+
+    lookups = [
+        'lt' if descending == forward else 'gt'
+        for _, descending in fields
+    ]
+    first_name = fields[0][0]
+    bound = Q(**{f'{first_name}__{lookups[0]}e': values[0]})
+    condition = Q()
+    for index, (name, _) in enumerate(fields):
+        equal = {
+            prev_name: value
+            for (prev_name, _), value in zip(fields[:index], values[:index])
+        }
+        equal[f'{name}__{lookups[index]}'] = values[index]
+        condition |= Q(**equal)
+    return bound & condition
+
+
+class Row:
+    """Attribute access to a ``values()`` row, for ``value_to_string``."""
+
+    def __init__(self, values):
+        self.__dict__.update(values)
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator for the feeds.
+
+    Instead of ``OFFSET n LIMIT k`` the page is selected by a seek
+    condition on the ordering key, so any page costs the same as the
+    first one. No ``COUNT(*)`` is issued: one extra row is fetched to
+    find out whether there is a next page. ``count``, ``num_pages`` and
+    ``page_range`` are inherited and still work, but the feeds never
+    touch them. ``object_list`` may also be a ``values()`` queryset that
+    selects the ordering fields.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-pub_date', '-id')):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def _model_field(self, name):
+        return self.object_list.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        if isinstance(obj, dict):
+            # A ``values()`` row, keyed by the names of the ordering.
+            obj = Row({
+                self._model_field(name).attname: obj[name]
+                for name, _ in self.fields
+            })
+        return pack_cursor(direction, [
+            self._model_field(name).value_to_string(obj)
+            for name, _ in self.fields
+        ])
+
+    def decode_cursor(self, cursor):
+        direction, values = unpack_cursor(cursor, len(self.fields))
+        try:
+            values = [
+                self._model_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+        return direction, values
+
+    def _seek(self, values, forward):
+        return seek(self.fields, values, forward)
+
+    def window(self, values, forward, limit):
+        """Up to ``limit`` rows past the cursor ``values``, or from the
+        start without one, in the direction of travel.
+        """
+
+        queryset = self.object_list
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        if not forward:
+            queryset = queryset.reverse()
+        return list(queryset[:limit])
+
+    def page(self, cursor=None):
+        values, forward = None, True
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+            forward = direction == 'next'
+        rows = self.window(values, forward, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        return CursorPage(rows, self, cursor, has_next, has_previous)
+
+    def get_page(self, cursor=None):
+        """Like ``Paginator.get_page``: a broken cursor gives
+        the first page instead of an error.
+        """
+
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class CursorPage(Page):
+    """A page of ``CursorPaginator``, navigated by opaque cursors
+    rather than page numbers: the number-based methods of ``Page``
+    raise ``NotImplementedError``.
+    """
+
+    def __init__(self, object_list, paginator, cursor,
+                 has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Page %s>' % (self.cursor or 'first')
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def _no_numbers(self, *args, **kwargs):
+        raise TypeError(
+            'У страницы CursorPaginator нет номера, '
+            'используйте next_cursor и previous_cursor'
+        )
+
+    next_page_number = previous_page_number = _no_numbers
+    start_index = end_index = _no_numbers
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1], 'next')
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0], 'prev')
+        return None
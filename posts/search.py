@@ -0,0 +1,166 @@
+"""Full-text search over posts and comments.
+
+On SQLite the texts are indexed in FTS5 tables (an inverted index),
+kept in sync by the signals in ``posts.signals``. The index stores the
+Snowball stems of the words (``posts.stemmer``), and queries are stemmed
+the same way, so any form of a Russian word finds the others. Results
+are ranked by bm25 and paged by ``(rank, id)`` keyset cursors.
+Other databases fall back to ``icontains`` ordered by date.
+"""
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from posts.models import Post
+from posts.paginator import (
+    CursorPage, CursorPaginator, InvalidCursor, pack_cursor, unpack_cursor,
+)
+from posts.stemmer import WORD, stem, stem_text
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """FTS5 query matching every word of ``query``, or ``None``.
+    Each stem is quoted, so the FTS5 syntax cannot be injected.
+    """
+
+    stems = [stem(word) for word in WORD.findall(query.lower())]
+    if not stems:
+        return None
+    return ' '.join(f'"{word}"' for word in dict.fromkeys(stems))
+
+
+class SearchIndex:
+    """One FTS5 table, ``rowid`` is the primary key of the row."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def add_many(self, rows):
+        """Index ``(pk, text)`` pairs, replacing older entries."""
+        if not enabled():
+            return
+        rows = [(pk, stem_text(text)) for pk, text in rows]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows],
+            )
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, body) VALUES (%s, %s)',
+                rows,
+            )
+
+    def add(self, pk, text):
+        self.add_many([(pk, text)])
+
+    def remove(self, pk):
+        if enabled():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {self.table} WHERE rowid = %s', [pk]
+                )
+
+    def clear(self):
+        if enabled():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table}')
+
+    def matching(self, match):
+        """Subquery of the matching primary keys, for ``pk__in``."""
+        return RawSQL(
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+            [match],
+        )
+
+    def ranked(self, match, limit, after=None, forward=True):
+        """``(pk, rank)`` of the best matches, best first, starting
+        after (or, going back, before) the ``(rank, pk)`` cursor row.
+        """
+
+        sql = (
+            f'SELECT rowid, rank FROM {self.table} '
+            f'WHERE {self.table} MATCH %s'
+        )
+        params = [match]
+        if after is not None:
+            rank, pk = after
+            sql += (
+                ' AND (rank > %s OR (rank = %s AND rowid < %s))' if forward
+                else ' AND (rank < %s OR (rank = %s AND rowid > %s))'
+            )
+            params += [rank, rank, pk]
+        sql += (
+            ' ORDER BY rank, rowid DESC' if forward
+            else ' ORDER BY rank DESC, rowid'
+        )
+        sql += ' LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+POSTS = SearchIndex('posts_post_fts')
+COMMENTS = SearchIndex('posts_comment_fts')
+
+
+class SearchPaginator(Paginator):
+    """Keyset pages of the posts matching ``query``, best first.
+    Like ``CursorPaginator``, it never counts the matches.
+    """
+
+    def __init__(self, query, per_page):
+        super().__init__([], per_page)
+        self.match = match_expression(query)
+
+    def encode_cursor(self, post, direction):
+        return pack_cursor(direction, [post.search_rank, post.pk])
+
+    def decode_cursor(self, cursor):
+        direction, (rank, pk) = unpack_cursor(cursor, 2)
+        if not isinstance(rank, (int, float)) or not isinstance(pk, int):
+            raise InvalidCursor('Некорректный курсор')
+        return direction, (rank, pk)
+
+    def page(self, cursor=None):
+        after, forward = None, True
+        if cursor:
+            direction, after = self.decode_cursor(cursor)
+            forward = direction == 'next'
+        rows = []
+        if self.match is not None:
+            rows = POSTS.ranked(self.match, self.per_page + 1, after, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if forward:
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            rows.reverse()
+            has_next, has_previous = bool(rows), has_more
+        posts = Post.objects.feed().in_bulk([pk for pk, _ in rows])
+        found = []
+        for pk, rank in rows:
+            if pk in posts:
+                posts[pk].search_rank = rank
+                found.append(posts[pk])
+        return CursorPage(found, self, cursor, has_next, has_previous)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+def paginator(query, per_page):
+    """Paginator over the posts matching ``query``."""
+    if enabled():
+        return SearchPaginator(query, per_page)
+    posts = Post.objects.feed().filter(text__icontains=query)
+    return CursorPaginator(posts, per_page)
@@ -0,0 +1,127 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from posts import cards, conditional, search, timeline
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+def touch_pages(post, *scopes):
+    conditional.touch(
+        'index',
+        f'post:{post.pk}',
+        f'user:{post.author_id}',
+        f'group:{post.group_id}' if post.group_id else None,
+        *scopes,
+    )
+
+
+def group_left(post, update_fields):
+    """The group an edit has moved ``post`` out of, as it was read
+    (``Post.from_db``), without a query. ``None`` for a post saved
+    without being read.
+    """
+
+    if update_fields and not {'group', 'group_id'} & update_fields:
+        return None
+    previous = getattr(post, 'loaded_group_id', None)
+    return None if previous == post.group_id else previous
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, update_fields, **kwargs):
+    previous = None
+    if created:
+        UserStats.bump(instance.author_id, posts=1)
+        timeline.fan_out(instance)
+    else:
+        cards.touch(instance.pk)
+        previous = group_left(instance, update_fields)
+    instance.loaded_group_id = instance.group_id
+    search.POSTS.add(instance.pk, instance.text)
+    touch_pages(instance, f'group:{previous}' if previous else None)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, posts=-1)
+    cards.forget(instance.pk)
+    search.POSTS.remove(instance.pk)
+    touch_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.author_id, comments=1)
+    cards.touch(instance.post_id)
+    search.COMMENTS.add(instance.pk, instance.text)
+    conditional.touch_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.author_id, comments=-1)
+    cards.touch(instance.post_id)
+    search.COMMENTS.remove(instance.pk)
+    conditional.touch_post(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        UserStats.bump(instance.user_id, following=1)
+        UserStats.bump(instance.author_id, followers=1)
+        timeline.backfill(instance)
+        conditional.touch(
+            f'user:{instance.user_id}', f'user:{instance.author_id}'
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    UserStats.bump(instance.user_id, following=-1)
+    UserStats.bump(instance.author_id, followers=-1)
+    timeline.prune(instance)
+    if timeline.dropped_below_limit(instance.author_id):
+        timeline.backfill_followers(instance.author_id)
+    conditional.touch(
+        f'user:{instance.user_id}', f'user:{instance.author_id}'
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        conditional.touch(f'group:{instance.pk}')
+        return
+    # The title is on the cards of its posts, wherever they are listed.
+    cards.touch(f'group:{instance.pk}')
+    authors = Post.objects.filter(group=instance).values_list(
+        'author_id', flat=True
+    ).distinct()
+    conditional.touch(
+        'index',
+        f'group:{instance.pk}',
+        *(f'user:{author_id}' for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # A login saves last_login alone.
+    if created or (update_fields and 'username' not in update_fields):
+        return
+    # The name is on the cards of the user's posts and by the comments.
+    cards.touch(f'user:{instance.pk}')
+    groups = Post.objects.filter(
+        author=instance, group__isnull=False
+    ).values_list('group_id', flat=True).distinct()
+    commented = Comment.objects.filter(author=instance).values_list(
+        'post_id', flat=True
+    ).distinct()
+    conditional.touch(
+        'index',
+        f'user:{instance.pk}',
+        *(f'group:{group_id}' for group_id in groups),
+        *(f'post:{post_id}' for post_id in commented),
+    )
@@ -0,0 +1,46 @@
+from django import template
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+from posts import cards
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_item.html'
+
+
+def card_template(context):
+    # Looked up once per page, like the template of {% include %}.
+    found = context.render_context.get(CARD_TEMPLATE)
+    if found is None:
+        found = context.template.engine.get_template(CARD_TEMPLATE)
+        context.render_context[CARD_TEMPLATE] = found
+    return found
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, full_text=False):
+    """The card of a post: the one fetched by ``cards.attach_versions``,
+    or the cached one, or ``includes/post_item.html`` rendered in a
+    context of its own and cached, see ``posts.cards``.
+    """
+
+    is_author = cards.is_author(context.get('user'), post)
+    html = getattr(post, 'card_html', None)
+    if html is not None:
+        return mark_safe(html)
+    versioned = hasattr(post, 'card_version')
+    if versioned and not hasattr(post, 'card_html'):
+        html = cache.get(cards.fragment_key(post, full_text, is_author))
+    if html is None:
+        html = card_template(context).render(template.Context(
+            {'post': post, 'full_text': full_text, 'is_author': is_author},
+            autoescape=context.autoescape,
+        ))
+        if versioned:
+            cache.set(
+                cards.fragment_key(post, full_text, is_author),
+                html,
+                cards.FRAGMENT_TIMEOUT,
+            )
+    return mark_safe(html)
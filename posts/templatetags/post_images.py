@@ -0,0 +1,15 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_image_url(post, geometry):
+    """The thumbnail of the post image, or the original
+    while the thumbnail is being built in the background.
+    """
+
+    thumbnail = thumbnails.ready(post, geometry)
+    return thumbnail.url if thumbnail else post.image.url
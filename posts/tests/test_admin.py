@@ -0,0 +1,142 @@
+from datetime import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.admin import PostAdmin
+from posts.models import Comment, Group, Post, User
+
+
+class ScalableAdminTest(TestCase):
+    """Changelists cost the same for any number of rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='Admin', email='admin@example.com', password='secret'
+        )
+        cls.group = Group.objects.create(
+            title='Админка',
+            slug='admin-group',
+            description='Описание',
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count, **fields):
+        for _ in range(count):
+            author = User.objects.create_user(
+                username=f'Writer{User.objects.count()}'
+            )
+            post = Post.objects.create(
+                text='Пост', author=author, group=self.group
+            )
+            Comment.objects.create(post=post, author=author, text='Ответ')
+            if fields:
+                Post.objects.filter(pk=post.pk).update(**fields)
+
+    def changelist_queries(self, name, params=None):
+        url = reverse(f'admin:posts_{name}_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_posts(2)
+        few = {
+            name: self.changelist_queries(name)[0]
+            for name in ('post', 'comment', 'group', 'userstats')
+        }
+        self.add_posts(8)
+        for name, queries in few.items():
+            with self.subTest(name=name):
+                self.assertEqual(self.changelist_queries(name)[0], queries)
+
+    def test_related_fields_use_widgets_not_selects(self):
+        response = self.client.get(reverse('admin:posts_post_add'))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, '<option value="{}"'.format(
+            self.admin.pk
+        ))
+        response = self.client.get(reverse('admin:posts_comment_add'))
+        self.assertContains(response, 'vForeignKeyRawIdAdminField')
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    def test_estimated_and_bounded_counts(self):
+        self.add_posts(5)
+        _, response = self.changelist_queries('post')
+        # The largest primary key, no statistics without ANALYZE.
+        self.assertEqual(
+            response.context['cl'].result_count,
+            Post.objects.latest('pk').pk,
+        )
+        self.assertContains(
+            response, f'≈&nbsp;{Post.objects.latest("pk").pk} '
+        )
+        _, response = self.changelist_queries(
+            'post', {'group__id__exact': self.group.pk}
+        )
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, '3+ ')
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        _, response = self.changelist_queries('post')
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    @mock.patch.object(PostAdmin, 'list_per_page', 2)
+    def test_page_past_an_estimate_is_the_last_page(self):
+        self.add_posts(6)
+        Post.objects.filter(
+            pk__in=Post.objects.order_by('pk')[:3].values('pk')
+        ).delete()
+        # Estimated from the largest key: at least six, three pages.
+        _, response = self.changelist_queries('post', {'p': 2})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        self.assertEqual(response.context['cl'].paginator.num_pages, 2)
+        self.assertNotContains(response, '≈')
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=3)
+    @mock.patch.object(PostAdmin, 'list_per_page', 2)
+    def test_pages_past_a_bounded_count(self):
+        self.add_posts(7)
+        params = {'group__id__exact': self.group.pk}
+        _, response = self.changelist_queries('post', params)
+        self.assertEqual(response.context['cl'].paginator.num_pages, 2)
+        # The admin numbers its pages from zero.
+        _, response = self.changelist_queries('post', {**params, 'p': 1})
+        paginator = response.context['cl'].paginator
+        self.assertEqual((paginator.count, paginator.num_pages), (5, 3))
+        self.assertContains(response, '5+ ')
+        self.assertContains(response, 'p=2')
+        _, response = self.changelist_queries('post', {**params, 'p': 3})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        self.assertEqual(response.context['cl'].paginator.count, 7)
+        self.assertNotContains(response, '7+ ')
+
+    def test_date_hierarchy(self):
+        self.add_posts(1, pub_date=timezone.make_aware(datetime(2019, 3, 5)))
+        self.add_posts(1, pub_date=timezone.make_aware(datetime(2019, 7, 9)))
+        self.add_posts(1, pub_date=timezone.make_aware(datetime(2021, 1, 1)))
+        _, response = self.changelist_queries('post')
+        self.assertContains(response, 'pub_date__year=2019')
+        self.assertNotContains(response, 'pub_date__year=2020')
+        _, response = self.changelist_queries(
+            'post', {'pub_date__year': 2019}
+        )
+        self.assertContains(response, 'pub_date__month=3')
+        self.assertContains(response, 'pub_date__month=7')
+        self.assertNotContains(response, 'pub_date__month=4')
+        queries, response = self.changelist_queries(
+            'post', {'pub_date__year': 2019, 'pub_date__month': 7}
+        )
+        self.assertContains(response, 'pub_date__day=9')
+        self.assertNotContains(response, 'pub_date__day=8')
+        self.assertEqual(len(response.context['cl'].result_list), 1)
@@ -0,0 +1,162 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+
+@override_settings(API_PAGE_SIZE=5, COMMENTS_PER_PAGE=5)
+class ApiTest(TestCase):
+    """The JSON API mirrors the feeds."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='ApiAuthor', first_name='Апи'
+        )
+        self.reader = User.objects.create_user(username='ApiReader')
+        self.group = Group.objects.create(
+            title='Апи', slug='api-group', description='JSON'
+        )
+        Post.objects.bulk_create([
+            Post(
+                text=f'Пост API {number}',
+                author=self.author,
+                group=self.group if number % 2 else None,
+            )
+            for number in range(12)
+        ])
+        self.post = Post.objects.latest('id')
+        Comment.objects.bulk_create([
+            Comment(
+                post=self.post, author=self.reader, text=f'Ответ {number}'
+            )
+            for number in range(7)
+        ])
+        self.client = Client()
+
+    def walk(self, url, client=None, **params):
+        client = client or self.client
+        seen, cursor = [], ''
+        while cursor is not None:
+            response = client.get(url, {**params, 'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            seen += data['results']
+            cursor = data['next_cursor']
+        return seen
+
+    def test_lists_walk_the_feeds(self):
+        expected = list(Post.objects.order_by('-pub_date', '-id'))
+        lists = {
+            reverse('api_posts'): expected,
+            reverse('api_group_posts', args=['api-group']): [
+                post for post in expected if post.group_id
+            ],
+            reverse('api_profile_posts', args=['ApiAuthor']): expected,
+        }
+        for url, posts in lists.items():
+            with self.subTest(url=url):
+                seen = self.walk(url)
+                self.assertEqual(
+                    [row['id'] for row in seen], [post.pk for post in posts]
+                )
+        row = seen[0]
+        self.assertNotIn('text', row)
+        self.assertEqual(row['author']['first_name'], 'Апи')
+        self.assertEqual(row['group']['slug'], 'api-group')
+        self.assertEqual(row['comment_count'], 7)
+        self.assertEqual(
+            row['url'], reverse('post', args=['ApiAuthor', self.post.pk])
+        )
+        self.assertIsNone(row['image'])
+
+    @override_settings(PAGE_CACHE=True)
+    def test_one_query_per_page(self):
+        url = reverse('api_group_posts', args=['api-group'])
+        # The group lookup for the ETag, then the page.
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+
+    def test_sparse_fields(self):
+        url = reverse('api_posts')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'fields': 'id,author'})
+        self.assertEqual(
+            set(response.json()['results'][0]), {'id', 'author'}
+        )
+        sql = context.captured_queries[-1]['sql']
+        self.assertNotIn('COUNT', sql)
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('posts_group', sql)
+        response = self.client.get(url, {'fields': 'id,likes'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('likes', response.json()['detail'])
+
+    def test_post_and_comments(self):
+        url = reverse('api_post', args=['ApiAuthor', self.post.pk])
+        data = self.client.get(url).json()
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['comment_count'], 7)
+        comments = self.walk(
+            reverse('api_post_comments', args=['ApiAuthor', self.post.pk])
+        )
+        self.assertEqual(
+            [comment['text'] for comment in comments],
+            [f'Ответ {number}' for number in range(7)],
+        )
+        self.assertEqual(comments[0]['author']['username'], 'ApiReader')
+
+    def test_errors(self):
+        urls = {
+            reverse('api_group_posts', args=['nothing']): 404,
+            reverse('api_profile_posts', args=['Nobody']): 404,
+            reverse('api_post', args=['ApiReader', self.post.pk]): 404,
+            reverse('api_follow_posts'): 401,
+            f'{reverse("api_posts")}?cursor=garbage': 400,
+        }
+        for url, status in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status)
+                self.assertIn('detail', response.json())
+
+    def test_image_urls(self):
+        Post.objects.filter(pk=self.post.pk).update(image='posts/api.jpg')
+        response = self.client.get(
+            reverse('api_post', args=['ApiAuthor', self.post.pk]),
+            {'fields': 'image'},
+        )
+        image = response.json()['image']
+        self.assertTrue(image['url'].endswith('posts/api.jpg'))
+        # Not built yet: the original stands in for the thumbnail.
+        self.assertEqual(image['thumbnails'], {'960x339': image['url']})
+
+    def test_follow_posts(self):
+        client = Client()
+        client.force_login(self.reader)
+        UserStats.objects.for_user(self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        expected = [
+            post.pk for post in Post.objects.order_by('-pub_date', '-id')
+        ]
+        url = reverse('api_follow_posts')
+        seen = self.walk(url, client, fields='id')
+        self.assertEqual([row['id'] for row in seen], expected)
+        # The author is fanned out on read: the same posts.
+        with override_settings(TIMELINE_FANOUT_LIMIT=1):
+            seen = self.walk(url, client, fields='id')
+            self.assertEqual([row['id'] for row in seen], expected)
+            first = client.get(url, {'fields': 'id'}).json()
+            second = client.get(
+                url, {'fields': 'id', 'cursor': first['next_cursor']}
+            ).json()
+            back = client.get(
+                url, {'fields': 'id', 'cursor': second['previous_cursor']}
+            ).json()
+        self.assertEqual(back['results'], first['results'])
@@ -0,0 +1,94 @@
+import json
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+
+class BenchmarkTest(TestCase):
+    """The seeder and the benchmark work together on a tiny dataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'seed_benchmark', '--users', '30', '--posts', '300',
+            '--comments', '100', '--follows', '120', '--groups', '3',
+            stdout=StringIO(),
+        )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_seeded_dataset(self):
+        self.assertEqual(Post.objects.count(), 300)
+        # Power law: the first user writes far more than the median one.
+        top = Post.objects.filter(author__username='bench_0').count()
+        self.assertGreater(top, 300 / 30 * 3)
+        self.assertEqual(Follow.objects.count(), 120)
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            UserStats.objects.get(user__username='bench_0').posts, top
+        )
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', stdout=StringIO())
+
+    def test_dates_grow_with_ids(self):
+        dates = list(
+            Post.objects.order_by('pk').values_list('pub_date', flat=True)
+        )
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(len(set(dates)), len(dates))
+
+    def test_baseline_and_compare(self):
+        baseline = f'{self.directory}/baseline.json'
+        call_command(
+            'benchmark', '--requests', '3', '--output', baseline,
+            stdout=StringIO(),
+        )
+        with open(baseline) as file:
+            result = json.load(file)
+        self.assertEqual(set(result['views']), {
+            'index', 'group_posts', 'profile', 'post_view', 'follow_index',
+        })
+        for row in result['views'].values():
+            self.assertGreater(row['queries'], 0)
+            self.assertLessEqual(row['p50_ms'], row['p99_ms'])
+
+        stdout = StringIO()
+        call_command(
+            'benchmark', '--requests', '3', '--compare', baseline,
+            '--tolerance', '100', stdout=stdout,
+        )
+        self.assertIn(
+            'Не хуже базовой линии', stdout.getvalue()
+        )
+
+        result['views']['index']['queries'] = 0
+        with open(baseline, 'w') as file:
+            json.dump(result, file)
+        with self.assertRaisesMessage(
+            CommandError, 'index: запросов 0'
+        ):
+            call_command(
+                'benchmark', '--requests', '3', '--compare', baseline,
+                '--tolerance', '100', stdout=StringIO(),
+            )
+
+    def test_template_benchmark(self):
+        output = f'{self.directory}/templates.json'
+        call_command(
+            'template_benchmark', '--pages', '2', '--output', output,
+            stdout=StringIO(),
+        )
+        with open(output) as file:
+            result = json.load(file)
+        self.assertEqual(len(result), 8)
+        for row in result.values():
+            self.assertEqual(row['cards'], 10)
+            self.assertGreater(row['median_us_per_card'], 0)
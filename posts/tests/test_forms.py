@@ -1,6 +1,16 @@
-from django.test import Client, TestCase
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts import uploads
 from posts.models import Group, Post, User
 
 
@@ -97,3 +107,89 @@ class PostFormTest(TestCase):
             follow=True
         )
         self.assertEqual(Post.objects.count(), post_count)
+
+
+class ImageUploadTest(TestCase):
+    """Uploads are size-bounded and checked before decoding."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        cls.user = User.objects.create_user(username='Uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(ImageUploadTest.user)
+
+    @staticmethod
+    def jpeg(size, exif=None):
+        buffer = BytesIO()
+        image = Image.new('RGB', size, 'blue')
+        if exif is None:
+            image.save(buffer, 'JPEG')
+        else:
+            image.save(buffer, 'JPEG', exif=exif)
+        return buffer.getvalue()
+
+    def post_image(self, content):
+        return self.client.post(reverse('new_post'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile('photo.jpg', content, 'image/jpeg'),
+        })
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_oversize_upload_is_rejected(self):
+        response = self.post_image(self.jpeg((400, 400)) + b'\0' * 4096)
+        self.assertTrue(response.context['form'].has_error('image', 'empty'))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_limit_is_scoped_to_the_post_forms(self):
+        post = Post.objects.create(text='Пост', author=self.user)
+        response = self.client.post(
+            reverse('post_edit', args=[self.user.username, post.pk]),
+            {
+                'text': 'Правка',
+                'image': SimpleUploadedFile(
+                    'photo.jpg', self.jpeg((400, 400)) + b'\0' * 4096,
+                    'image/jpeg',
+                ),
+            },
+        )
+        self.assertTrue(response.context['form'].has_error('image', 'empty'))
+        # The CSRF check still runs, inside the view.
+        strict = Client(enforce_csrf_checks=True)
+        strict.force_login(ImageUploadTest.user)
+        response = strict.post(reverse('new_post'), {'text': 'Пост'})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_is_rejected(self):
+        response = self.post_image(self.jpeg((200, 200)))
+        self.assertTrue(response.context['form'].has_error('image'))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_normalize_strips_exif_and_caps_size(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees.
+        exif[0x010F] = 'Camera'
+        name = default_storage.save(
+            'posts/exif.jpg', ContentFile(self.jpeg((300, 200), exif))
+        )
+        normalized = uploads.normalize(name)
+        self.assertNotEqual(normalized, name)
+        self.assertTrue(default_storage.exists(name))
+        with default_storage.open(normalized) as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (67, 100))
+            self.assertFalse(image.info.get('exif'))
@@ -0,0 +1,201 @@
+import csv
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import (
+    Comment, Follow, Group, Post, TimelineEntry, User, UserStats,
+)
+
+
+class ImportPostsTest(TestCase):
+    """``manage.py import_posts`` loads archives in batches."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.author = User.objects.create_user(username='Archivist')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(
+            title='Архив', slug='archive', description='Старые посты'
+        )
+        UserStats.objects.for_user(self.author)
+
+    def write(self, name, text):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def run_import(self, path, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'import_posts', path, *args, stdout=stdout, stderr=stderr
+        )
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_jsonl_import(self):
+        records = [
+            {'type': 'follow', 'user': 'Reader', 'author': 'Archivist'},
+            {'type': 'post', 'id': 500, 'author': 'Archivist',
+             'text': 'Из архива', 'group': 'archive',
+             'pub_date': '2015-03-01T10:00:00'},
+            {'type': 'post', 'author': 'Newcomer', 'text': 'Новый автор'},
+            {'type': 'comment', 'id': 700, 'post': 500, 'author': 'Reader',
+             'text': 'Старый комментарий', 'created': '2015-03-02T10:00'},
+            {'type': 'post', 'author': 'Archivist', 'text': 'x',
+             'group': 'missing'},
+            {'type': 'comment', 'post': 999, 'author': 'Reader', 'text': 'x'},
+            {'type': 'follow', 'user': 'Reader', 'author': 'Reader'},
+        ]
+        path = self.write('archive.jsonl', '\n'.join(
+            json.dumps(record) for record in records
+        ) + '\n{broken\n')
+        stdout, stderr = self.run_import(
+            path, '--batch-size', '2', '--chunk-size', '3',
+            '--create-users',
+        )
+
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comments.get().created.day, 2)
+        self.assertTrue(Post.objects.filter(author__username='Newcomer'))
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author
+        ))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post
+        ))
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts, stats.followers), (1, 1))
+        self.assertEqual(len(stderr.splitlines()), 4)
+        self.assertIn('пропущено: 4', stdout)
+
+        # Posts with an id are not loaded twice.
+        self.run_import(path)
+        self.assertEqual(Post.objects.filter(text='Из архива').count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_each_follow_is_backfilled_once(self):
+        other = User.objects.create_user(username='Silent')
+        Follow.objects.create(user=other, author=self.author)
+        records = [
+            {'type': 'follow', 'user': 'Reader', 'author': 'Archivist'},
+            {'type': 'follow', 'user': 'Reader', 'author': 'Silent'},
+            {'type': 'post', 'author': 'Archivist', 'text': 'После подписки'},
+        ]
+        path = self.write('follows.jsonl', '\n'.join(
+            json.dumps(record) for record in records
+        ))
+        with mock.patch('posts.timeline.backfill') as backfill:
+            self.run_import(path, '--chunk-size', '1')
+        self.assertCountEqual(
+            [(call.args[0].user_id, call.args[0].author_id)
+             for call in backfill.call_args_list],
+            [(self.reader.pk, self.author.pk), (other.pk, self.author.pk),
+             (self.reader.pk, other.pk)],
+        )
+
+    def test_csv_import(self):
+        path = self.write('posts.csv', (
+            'author,text,group,pub_date\n'
+            'Archivist,Первый,,2016-01-01 00:00\n'
+            'Archivist,"Второй, с запятой",archive,\n'
+            'Nobody,Чужой,,\n'
+        ))
+        stdout, stderr = self.run_import(path, '--type', 'post')
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'Первый', 'Второй, с запятой'},
+        )
+        self.assertIn('Nobody', stderr)
+        self.assertEqual(UserStats.objects.get(user=self.author).posts, 2)
+        # The date of a row without an id is kept as well, and the
+        # field itself is left alone.
+        first = Post.objects.get(text='Первый')
+        self.assertEqual(first.pub_date.year, 2016)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+
+class ExportPostsTest(TestCase):
+    """Snapshots stream out in the format ``import_posts`` reads."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Exporter')
+        self.group = Group.objects.create(
+            title='Выгрузка', slug='export-group', description='Для тестов'
+        )
+        self.old = Post.objects.create(
+            text='Старый', author=self.author, group=self.group
+        )
+        Post.objects.filter(pk=self.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=10)
+        )
+        self.new = Post.objects.create(text='Новый', author=self.author)
+        Comment.objects.create(
+            post=self.new, author=self.author, text='Комментарий'
+        )
+
+    def export(self, *args):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('export_posts', *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_jsonl_round_trip(self):
+        stdout, stderr = self.export()
+        records = [json.loads(line) for line in stdout.splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['group', 'post', 'post', 'comment'],
+        )
+        self.assertEqual(records[1]['author'], 'Exporter')
+        self.assertEqual(records[1]['group'], 'export-group')
+        self.assertIn('Выгружено: 4', stderr)
+
+        path = f'{tempfile.mkdtemp()}/export.jsonl'
+        self.addCleanup(shutil.rmtree, path.rsplit('/', 1)[0])
+        call_command('export_posts', '--output', path, '--type', 'post',
+                     stderr=StringIO())
+        Post.objects.all().delete()
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(
+            Post.objects.get(pk=self.old.pk).pub_date.date(),
+            (timezone.now() - timedelta(days=10)).date(),
+        )
+
+    def test_incremental_csv(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        stdout, _ = self.export(
+            '--format', 'csv', '--since', since,
+            '--type', 'post', '--type', 'comment',
+        )
+        rows = list(csv.DictReader(StringIO(stdout)))
+        self.assertEqual(
+            [(row['type'], row['text']) for row in rows],
+            [('post', 'Новый'), ('comment', 'Комментарий')],
+        )
+
+    def test_endpoint_is_staff_only_and_streams(self):
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('export_posts')
+        self.assertEqual(client.get(url).status_code, 302)
+
+        self.author.is_staff = True
+        self.author.save()
+        response = client.get(url, {'type': 'post', 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(len(body.splitlines()), 3)
+        self.assertEqual(
+            client.get(url, {'since': 'вчера'}).status_code, 400
+        )
@@ -1,11 +1,18 @@
 import shutil
 import tempfile
+from io import StringIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.db.models import F
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
 
-from posts.models import Group, Post, User
+from posts.models import (
+    SUMMARY_CUT, Comment, Follow, Group, Post, User, UserStats,
+)
 
 
 @override_settings(MEDIA_ROOT='temp_media')
@@ -98,3 +105,159 @@ class FieldPostGroupModelTest(TestCase):
         post = FieldPostGroupModelTest.post
         expected_length_string = post.text[:15]
         self.assertEquals(expected_length_string, str(post))
+
+
+class UserStatsTest(TestCase):
+    """The denormalized counters follow writes and deletes."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='StatsAuthor')
+        self.reader = User.objects.create_user(username='StatsReader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        # Materialize the records so the signals have rows to update.
+        UserStats.objects.for_user(self.author)
+        UserStats.objects.for_user(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_for_user_counts_only_a_missing_record(self):
+        with self.assertNumQueries(1):
+            UserStats.objects.for_user(self.author)
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.filter(user=self.author).delete()
+        self.assertEqual(UserStats.objects.for_user(self.author).posts, 1)
+
+    def test_counters_follow_views(self):
+        self.reader_client.get(
+            reverse('profile_follow', args=[self.author.username])
+        )
+        self.author_client.post(reverse('new_post'), {'text': 'Пост'})
+        post = Post.objects.get(author=self.author)
+        self.reader_client.post(
+            reverse('add_comment', args=[self.author.username, post.id]),
+            {'text': 'Коммент'},
+        )
+        self.assertEqual(self.stats(self.author).followers, 1)
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertEqual(self.stats(self.reader).following, 1)
+        self.assertEqual(self.stats(self.reader).comments, 1)
+
+        self.reader_client.get(
+            reverse('profile_unfollow', args=[self.author.username])
+        )
+        post.delete()
+        self.assertEqual(self.stats(self.author).followers, 0)
+        self.assertEqual(self.stats(self.author).posts, 0)
+        self.assertEqual(self.stats(self.reader).following, 0)
+        self.assertEqual(self.stats(self.reader).comments, 0)
+
+    def test_cascade_delete_of_user(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.reader)
+        Comment.objects.create(post=post, author=self.author, text='К')
+        self.reader.delete()
+        self.assertEqual(self.stats(self.author).followers, 0)
+        self.assertEqual(self.stats(self.author).comments, 0)
+        self.assertFalse(UserStats.objects.filter(user_id=self.reader.pk))
+
+    def test_reconcile_command_fixes_drift(self):
+        Post.objects.create(text='Пост', author=self.author)
+        UserStats.objects.filter(user=self.author).update(posts=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('создано: 1, исправлено: 1', out.getvalue())
+        self.assertEqual(self.stats(self.author).posts, 1)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_card_reads_stats(self):
+        UserStats.objects.filter(user=self.author).update(followers=7)
+        response = self.reader_client.get(
+            reverse('profile', args=[self.author.username])
+        )
+        self.assertContains(response, 'Подписчиков: 7')
+
+
+class FeedIndexTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        out = StringIO()
+        call_command('audit_indexes', stdout=out)
+        self.assertIn('Все запросы лент по индексам', out.getvalue())
+
+    def test_follow_is_unique(self):
+        user = User.objects.create_user(username='UniqueUser')
+        author = User.objects.create_user(username='UniqueAuthor')
+        Follow.objects.create(user=user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=user, author=author)
+
+
+class PostSummaryTest(TestCase):
+    """Feed cards show ``summary_html`` instead of the body."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Summarizer')
+        self.text = (
+            'Первая <строка>\nвторая строка '
+            + 'слово ' * 200
+        )
+
+    def test_summary_on_save_and_bulk_create(self):
+        post = Post.objects.create(text=self.text, author=self.author)
+        Post.objects.bulk_create([
+            Post(text='Коротко', author=self.author)
+        ])
+        summary = Post.objects.get(pk=post.pk).summary_html
+        self.assertTrue(summary.startswith(
+            'Первая &lt;строка&gt;<br>'
+            'вторая строка слово'
+        ))
+        self.assertTrue(summary.endswith(SUMMARY_CUT))
+        self.assertLess(len(summary), 450)
+        self.assertTrue(Post.objects.get(pk=post.pk).summary_cut)
+        self.assertFalse(Post.objects.get(text='Коротко').summary_cut)
+        self.assertEqual(
+            Post.objects.get(text='Коротко').summary_html,
+            'Коротко',
+        )
+        post.text = 'Исправлено'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.summary_html, 'Исправлено')
+
+    def test_summary_on_update_and_bulk_update(self):
+        post = Post.objects.create(text=self.text, author=self.author)
+        Post.objects.filter(pk=post.pk).update(
+            text='Первая\nвторая'
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.summary_html, 'Первая<br>вторая')
+        post.text = '<b>Жирный</b>'
+        Post.objects.bulk_update([post], ['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.summary_html, '&lt;b&gt;Жирный&lt;/b&gt;')
+        # An expression has no preview to compute.
+        with self.assertRaises(ValueError):
+            Post.objects.filter(pk=post.pk).update(text=F('text'))
+        Post.objects.filter(pk=post.pk).update(
+            text=F('text'), summary_html=F('summary_html')
+        )
+
+    def test_feed_leaves_the_body_unread(self):
+        Post.objects.create(text=self.text, author=self.author)
+        self.assertEqual(
+            Post.objects.feed().get().get_deferred_fields(), {'text'}
+        )
+        self.assertFalse(
+            Post.objects.feed(full_text=True).get().get_deferred_fields()
+        )
+        client = Client()
+        post = Post.objects.get()
+        self.assertContains(client.get(reverse('index')), 'Читать дальше')
+        self.assertContains(client.get(reverse(
+            'post', args=['Summarizer', post.pk]
+        )), 'слово ' * 200)
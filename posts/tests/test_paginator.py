@@ -0,0 +1,80 @@
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post, User
+from posts.paginator import CursorPaginator
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='CursorAuthor')
+        Post.objects.bulk_create([
+            Post(text=f'Пост № {number}', author=cls.author)
+            for number in range(25)
+        ])
+        # Equal dates: the order is decided by the id tie-breaker.
+        Post.objects.update(pub_date=timezone.now())
+        cls.ordered = list(Post.objects.order_by('-pub_date', '-id'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_walk_forward_and_back(self):
+        """Next/previous cursors visit every post exactly once."""
+
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(
+            list(first) + list(second) + list(third), self.ordered
+        )
+        self.assertFalse(first.has_previous())
+        self.assertTrue(second.has_previous())
+        self.assertTrue(second.has_next())
+        self.assertFalse(third.has_next())
+        self.assertEqual(len(third), 5)
+
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual(list(back), list(second))
+        back = paginator.get_page(back.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        for cursor in ('garbage', 'W10', 'WyJuZXh0IiwgWzFdXQ'):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(cursor)
+                self.assertEqual(list(page), self.ordered[:10])
+
+    def test_page_numbers_are_not_supported(self):
+        page = CursorPaginator(Post.objects.all(), 10).get_page()
+        for method in ('next_page_number', 'previous_page_number',
+                       'start_index', 'end_index'):
+            with self.subTest(method=method):
+                with self.assertRaises(TypeError):
+                    getattr(page, method)()
+
+    def test_no_count_query(self):
+        """A deep page is one query, without COUNT(*)."""
+
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+        with self.assertNumQueries(1):
+            page = paginator.get_page(cursor)
+            self.assertTrue(page.has_next())
+
+    def test_index_uses_cursor(self):
+        client = Client()
+        response = client.get(reverse('index'))
+        next_cursor = response.context['page'].next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        response = client.get(reverse('index'), {'cursor': next_cursor})
+        self.assertEqual(
+            list(response.context['page']), self.ordered[10:20]
+        )
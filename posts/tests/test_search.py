@@ -0,0 +1,87 @@
+from io import StringIO
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, User
+from posts.stemmer import stem
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_a_stem(self):
+        for words in (
+            ('пост', 'посты', 'постами', 'постов'),
+            ('книга', 'книги', 'книгой'),
+            ('красивый', 'красивые', 'красивого'),
+            ('читать', 'читала', 'читали'),
+        ):
+            self.assertEqual(len({stem(word) for word in words}), 1, words)
+        self.assertEqual(stem('django'), 'django')
+        self.assertEqual(stem('ёлка'), stem('елка'))
+
+
+class SearchTest(TestCase):
+    """/search/ and the admin use the FTS5 index."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='Searcher')
+        self.client = Client()
+        self.cats = Post.objects.create(
+            text='Кошки и коты: кошки любят спать', author=self.author
+        )
+        self.books = Post.objects.create(
+            text='Читаем книги про кошку', author=self.author
+        )
+        Post.objects.create(text='Собаки', author=self.author)
+
+    def found(self, query, **params):
+        response = self.client.get(reverse('search'), {'q': query, **params})
+        return response, [post.text for post in response.context['page']]
+
+    def test_ranked_and_stemmed(self):
+        _, found = self.found('кошками')
+        self.assertEqual(found, [self.cats.text, self.books.text])
+        _, found = self.found('книга кошкой')
+        self.assertEqual(found, [self.books.text])
+        _, found = self.found('"кошки" OR NEAR(')
+        self.assertEqual(found, [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.cats.text = 'Только собаки'
+        self.cats.save()
+        self.assertEqual(self.found('кошки')[1], [self.books.text])
+        self.books.delete()
+        self.assertEqual(self.found('кошки')[1], [])
+
+    def test_keyset_pages(self):
+        Post.objects.bulk_create([
+            Post(text=f'Кошка номер {number}', author=self.author)
+            for number in range(12)
+        ])
+        call_command('rebuild_search_index', stdout=StringIO())
+        response, first = self.found('кошка')
+        page = response.context['page']
+        self.assertEqual(len(first), 10)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%88%D0%BA%D0%B0')
+        _, second = self.found('кошка', cursor=page.next_cursor)
+        self.assertEqual(len(second), 4)
+        self.assertFalse(set(first) & set(second))
+
+    def test_admin_search(self):
+        Comment.objects.create(
+            post=self.books, author=self.author, text='Кошачьи книги'
+        )
+        AuthUser.objects.create_superuser('boss', 'boss@ya.ru', 'pass')
+        self.client.login(username='boss', password='pass')
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'книгами'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.books]
+        )
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'), {'q': 'книга'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
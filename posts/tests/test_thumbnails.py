@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post, User
+
+
+def jpeg(name):
+    buffer = BytesIO()
+    Image.new('RGB', (1200, 800), 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+class ThumbnailPipelineTest(TransactionTestCase):
+    """Thumbnails are built by the pool, not while rendering."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        # override_settings also points the default storage at it.
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='ImageAuthor')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_new_post_queues_thumbnails(self):
+        self.client.post(
+            reverse('new_post'),
+            {'text': 'Пост с картинкой', 'image': jpeg('queued.jpg')},
+        )
+        thumbnails.wait(10)
+        post = Post.objects.get(text='Пост с картинкой')
+        thumbnail = thumbnails.ready(post, '960x339')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=600)
+    def test_post_is_moved_to_the_normalized_copy(self):
+        post = Post.objects.create(
+            text='Большая', author=self.author, image=jpeg('big.jpg')
+        )
+        original = post.image.name
+        thumbnails.enqueue(post)
+        thumbnails.wait(10)
+        post.refresh_from_db()
+        self.assertNotEqual(post.image.name, original)
+        self.assertEqual(post.image.width, 600)
+        self.assertFalse(default_storage.exists(original))
+        self.assertIsNotNone(thumbnails.ready(post, '960x339'))
+
+    def test_card_falls_back_to_original_until_built(self):
+        post = Post.objects.create(
+            text='Старый пост', author=self.author, image=jpeg('old.jpg')
+        )
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, f'src="{post.image.url}"')
+
+        thumbnails.enqueue(post)
+        thumbnails.wait(10)
+        response = self.client.get(reverse('index'))
+        thumbnail = thumbnails.ready(post, '960x339')
+        self.assertContains(response, f'src="{thumbnail.url}"')
+        self.assertNotContains(response, f'src="{post.image.url}"')
+
+    def test_ready_names_the_file_get_thumbnail_builds(self):
+        """``_thumbnail_file`` repeats private steps of sorl-thumbnail,
+        pinned in requirements.txt: it must name the very file that
+        ``get_thumbnail`` writes.
+        """
+
+        names = [
+            default_storage.save('posts/named.jpg', jpeg('named.jpg')),
+            default_storage.save('posts/named.png', jpeg('named.png')),
+        ]
+        cases = [
+            *settings.POST_THUMBNAIL_SIZES.items(),
+            ('100x100', {}),
+            ('x50', {'quality': 50, 'format': 'PNG'}),
+        ]
+        for preserve in (False, True):
+            for name in names:
+                for geometry, options in cases:
+                    with self.subTest(
+                        preserve=preserve, name=name, geometry=geometry
+                    ), mock.patch.object(
+                        # Read by sorl once, override_settings is lost.
+                        sorl_settings, 'THUMBNAIL_PRESERVE_FORMAT', preserve
+                    ):
+                        built = get_thumbnail(name, geometry, **options)
+                        predicted = thumbnails._thumbnail_file(
+                            ImageFile(name), geometry, options
+                        )
+                        self.assertEqual(predicted.name, built.name)
@@ -0,0 +1,119 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+
+
+class TimelineTest(TestCase):
+    """The /follow/ feed is served from the materialized timeline."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='TimelineAuthor')
+        self.reader = User.objects.create_user(username='TimelineReader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        UserStats.objects.for_user(self.author)
+
+    def follow_page(self):
+        response = self.reader_client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_fan_out_backfill_and_prune(self):
+        Post.objects.create(text='До подписки', author=self.author)
+        self.reader_client.get(
+            reverse('profile_follow', args=[self.author.username])
+        )
+        Post.objects.create(text='После подписки', author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 2)
+        self.assertEqual(self.follow_page(), ['После подписки', 'До подписки'])
+
+        self.reader_client.get(
+            reverse('profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.follow_page(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_merged_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.follow_page(), ['Пост звезды'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_without_stats_is_counted(self):
+        other = User.objects.create_user(username='TimelineOther')
+        UserStats.objects.filter(user=self.author).delete()
+        # Bulk follows, without signals: no stats record is created.
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=self.author),
+            Follow(user=other, author=self.author),
+        ])
+        self.assertEqual(self.follow_page(), [])
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).followers, 2
+        )
+        UserStats.objects.filter(user=self.author).delete()
+        Post.objects.create(text='Без счетчиков', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader))
+        self.assertEqual(self.follow_page(), ['Без счетчиков'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_author_crossing_the_limit_keeps_the_feed_whole(self):
+        other = User.objects.create_user(username='TimelineOther')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Дошел', author=self.author)
+        # Up: the delivered entry stays, but is not read twice.
+        Follow.objects.create(user=other, author=self.author)
+        Post.objects.create(text='Слит', author=self.author)
+        self.assertEqual(self.follow_page(), ['Слит', 'Дошел'])
+        # Down: the post published in between is delivered too.
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 2)
+        self.assertEqual(self.follow_page(), ['Слит', 'Дошел'])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2)
+    def test_merged_feed_pages(self):
+        star = User.objects.create_user(username='TimelineStar')
+        fan = User.objects.create_user(username='TimelineFan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=star)
+        Follow.objects.create(user=fan, author=star)
+        for number in range(12):
+            Post.objects.create(
+                text=f'Пост {number}',
+                author=star if number % 3 else self.author,
+            )
+        expected = [
+            post.text for post in Post.objects.order_by('-pub_date', '-id')
+        ]
+        pages = []
+        for number in (1, 2):
+            response = self.reader_client.get(
+                reverse('follow_index'), {'page': number}
+            )
+            pages += [post.text for post in response.context['page']]
+        self.assertEqual(pages, expected)
+
+    def test_rebuild_command(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.bulk_create([
+            Post(text=f'Импорт {number}', author=self.author)
+            for number in range(3)
+        ])
+        call_command('rebuild_timeline', stdout=StringIO())
+        self.assertEqual(len(self.follow_page()), 3)
+
+    def test_backfill_more_rows_than_one_sqlite_insert(self):
+        Post.objects.bulk_create([
+            Post(text=f'Архив {number}', author=self.author)
+            for number in range(600)
+        ])
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 600)
@@ -0,0 +1,22 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Run the ``transaction.on_commit`` callbacks registered inside
+    the block, as if their transaction committed, which it never does
+    in a ``TestCase``. ``captureOnCommitCallbacks(execute=True)``
+    of later Django versions.
+    """
+
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        callbacks = connection.run_on_commit[start:]
+        del connection.run_on_commit[start:]
+        for _, callback in callbacks:
+            callback()
@@ -0,0 +1,137 @@
+"""Thumbnails of post images, built ahead of time by a thread pool.
+
+``new_post``, ``post_edit`` and the admin queue the post image, a worker
+normalizes it into a new file (``posts.uploads.normalize``), moves the
+post to it and renders every size of ``POST_THUMBNAIL_SIZES`` through
+sorl-thumbnail.
+A card shows the thumbnail once sorl knows about it and the original
+image until then, so no request waits for Pillow. Images of older posts
+are built with ``manage.py build_thumbnails``.
+"""
+import logging
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import (
+    defaults as sorl_defaults,
+    settings as sorl_settings,
+)
+from sorl.thumbnail.images import ImageFile
+
+from posts import cards, conditional, uploads
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = {}
+_lock = threading.Lock()
+
+
+def _pool():
+    # Created on first use, so that it never crosses a worker fork.
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = futures.ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def build(post_id, name):
+    """Render every configured size of one image."""
+    for geometry, options in settings.POST_THUMBNAIL_SIZES.items():
+        get_thumbnail(name, geometry, **options)
+    # The cached card and pages still show the original image.
+    cards.touch(post_id)
+    conditional.touch_post(post_id)
+
+
+def _work(post_id, name):
+    try:
+        normalized = uploads.normalize(name)
+        if normalized != name:
+            moved = Post.objects.filter(pk=post_id, image=name).update(
+                image=normalized
+            )
+            if not moved:
+                # The image was replaced meanwhile.
+                default_storage.delete(normalized)
+                return
+        build(post_id, normalized)
+        if normalized != name:
+            # Only now that the post and its cards show the copy.
+            default_storage.delete(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры %s', name)
+    finally:
+        connection.close()
+
+
+def _submit(post_id, name):
+    pool = _pool()
+    with _lock:
+        if name in _pending:
+            return
+        future = pool.submit(_work, post_id, name)
+        _pending[name] = future
+    future.add_done_callback(lambda done: _forget(name, done))
+
+
+def _forget(name, future):
+    with _lock:
+        if _pending.get(name) is future:
+            del _pending[name]
+
+
+def enqueue(post):
+    """Queue the thumbnails of the post image after the commit."""
+    if post.image:
+        post_id, name = post.pk, post.image.name
+        transaction.on_commit(lambda: _submit(post_id, name))
+
+
+def wait(timeout=None):
+    """Block until the queued thumbnails are built."""
+    with _lock:
+        pending = list(_pending.values())
+    futures.wait(pending, timeout)
+
+
+def _thumbnail_file(source, geometry, options):
+    """The file ``get_thumbnail`` would produce, without producing it.
+    Repeats private steps of the sorl-thumbnail backend: the version
+    is pinned in requirements.txt and the name is checked against
+    ``get_thumbnail`` in ``posts.tests.test_thumbnails``.
+    """
+
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage)
+
+
+def ready(post, geometry):
+    """The built thumbnail of the post image, or ``None``."""
+    return ready_image(post.image, geometry)
+
+
+def ready_image(image, geometry):
+    """``ready`` for an image file or its name in the storage."""
+    options = settings.POST_THUMBNAIL_SIZES[geometry]
+    source = ImageFile(image)
+    return default.kvstore.get(_thumbnail_file(source, geometry, options))
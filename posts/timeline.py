@@ -0,0 +1,240 @@
+"""Materialized ``/follow/`` feed.
+
+A new post is copied into the timeline of every follower of its author
+(fan-out on write), so reading the feed is a range scan over
+``(user, pub_date)``. Authors with ``TIMELINE_FANOUT_LIMIT`` or more
+followers are not fanned out: their posts are merged in when the feed
+is read (fan-out on read).
+
+An author who reaches the limit keeps the entries delivered so far,
+the read path ignores them. One who drops below it again is backfilled
+to the remaining followers, since the posts published in between are
+in no timeline.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import F
+
+from posts.models import Follow, Post, TimelineEntry, User, UserStats
+from posts.paginator import CursorPaginator, seek
+
+
+def followers(author_id):
+    """Followers of the author, from the stats record, which is
+    counted exactly if ``UserStats.bump`` has not got one yet.
+    """
+
+    return UserStats.objects.for_user(User(pk=author_id)).followers
+
+
+def is_fanned_out_on_read(author_id):
+    return followers(author_id) >= settings.TIMELINE_FANOUT_LIMIT
+
+
+def dropped_below_limit(author_id):
+    """Whether the author has just lost the follower that kept
+    them at ``TIMELINE_FANOUT_LIMIT``.
+    """
+
+    return followers(author_id) == settings.TIMELINE_FANOUT_LIMIT - 1
+
+
+def fan_out(post):
+    """Deliver a new post to the followers of its author."""
+    if is_fanned_out_on_read(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def latest_posts(author_id):
+    return Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL]
+
+
+def backfill(follow):
+    """Copy the latest posts of a newly followed author."""
+    if is_fanned_out_on_read(follow.author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=follow.user_id,
+                post_id=post_id,
+                author_id=follow.author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in latest_posts(follow.author_id)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_followers(author_id):
+    """Copy the latest posts of an author who is fanned out
+    on write again to all of their followers.
+    """
+
+    posts = list(latest_posts(author_id))
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in followers.iterator()
+            for post_id, pub_date in posts
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def prune(follow):
+    """Drop an unfollowed author's posts from the timeline."""
+    TimelineEntry.objects.filter(
+        user_id=follow.user_id, author_id=follow.author_id
+    ).delete()
+
+
+def read_authors(user):
+    """Ids of the followed authors that are fanned out on read."""
+    follows = Follow.objects.filter(user=user)
+    # Authors without a stats record are counted first.
+    for author_id in follows.filter(
+        author__stats__isnull=True
+    ).values_list('author_id', flat=True):
+        followers(author_id)
+    return list(follows.filter(
+        author__stats__followers__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+
+
+def union_ids(slices, limit, forward=True):
+    """Post ids of the first ``limit`` rows of ``UNION ALL`` of the
+    ordered ``slices``, ``values_list`` querysets of a date and a post
+    id, in one query.
+    """
+
+    using = slices[0].db
+    parts, params = [], []
+    for index, part in enumerate(slices):
+        # Wrapped, since a compound part may not have its own ORDER BY
+        # and LIMIT on every database.
+        sql, part_params = part.query.get_compiler(using).as_sql()
+        parts.append(f'SELECT * FROM ({sql}) part_{index}')
+        params.extend(part_params)
+    order = 'DESC' if forward else 'ASC'
+    sql = ' UNION ALL '.join(parts) + (
+        f' ORDER BY 1 {order}, 2 {order} LIMIT %s'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return [pk for _, pk in cursor.fetchall()]
+
+
+class FollowFeed:
+    """The feed of a user who follows authors fanned out on read.
+
+    Both of its parts are range scans: the delivered timeline over
+    ``(user, pub_date)`` and the posts of those authors over
+    ``(author, pub_date)``. A window of the feed is the ``UNION ALL``
+    of the two ordered slices, and only the posts of the window are
+    read, by id. ``posts`` is the queryset they are read from, of
+    models or of ``values()`` rows with ``id``.
+    """
+
+    ordered = True
+
+    def __init__(self, user, authors, posts=None):
+        self.user = user
+        self.authors = authors
+        self.posts = Post.objects.feed() if posts is None else posts
+
+    def parts(self):
+        """``(queryset, post id field)`` of the two parts."""
+        delivered = TimelineEntry.objects.filter(user=self.user).exclude(
+            author_id__in=self.authors
+        )
+        authored = Post.objects.filter(author_id__in=self.authors)
+        return [(delivered, 'post_id'), (authored, 'id')]
+
+    def count(self):
+        return sum(queryset.count() for queryset, _ in self.parts())
+
+    def window(self, limit, values=None, forward=True):
+        """Up to ``limit`` posts past the cursor ``values``, a date and
+        a post id, or from the start, in the direction of travel.
+        """
+
+        if not limit:
+            # What Paginator asks of an empty feed.
+            return []
+        order = '-' if forward else ''
+        slices = []
+        for queryset, pk in self.parts():
+            if values is not None:
+                queryset = queryset.filter(seek(
+                    [('pub_date', True), (pk, True)], values, forward
+                ))
+            slices.append(queryset.order_by(
+                f'{order}pub_date', f'{order}{pk}'
+            ).values_list('pub_date', pk)[:limit])
+        ids = union_ids(slices, limit, forward)
+        found = {}
+        for row in self.posts.filter(pk__in=ids):
+            found[row['id'] if isinstance(row, dict) else row.pk] = row
+        return [found[pk] for pk in ids if pk in found]
+
+    def __getitem__(self, key):
+        # What Paginator asks for: a bounded slice.
+        if isinstance(key, slice):
+            return self.window(key.stop)[key.start or 0:]
+        return self.window(key + 1)[key]
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """``CursorPaginator`` over a ``FollowFeed``."""
+
+    def __init__(self, feed, per_page):
+        super().__init__(feed.posts, per_page)
+        self.feed = feed
+
+    def window(self, values, forward, limit):
+        return self.feed.window(limit, values, forward)
+
+
+def follow_feed(user, authors=None, posts=None):
+    """Posts of the authors ``user`` follows, newest first.
+    ``authors`` are the ``read_authors`` of the user, if known.
+    A ``FollowFeed`` if there are any, otherwise a queryset.
+    """
+
+    if authors is None:
+        authors = read_authors(user)
+    if authors:
+        return FollowFeed(user, authors, posts)
+    if posts is None:
+        posts = Post.objects.feed()
+    return posts.filter(timeline_entries__user=user).order_by(
+        F('timeline_entries__pub_date').desc(),
+        F('timeline_entries__post_id').desc(),
+    )
@@ -0,0 +1,137 @@
+"""Bounded handling of uploaded post images.
+
+The upload is streamed to a temporary file in chunks and never held in
+memory. In the post form views (``limit_upload_size``) bytes past
+``POST_IMAGE_MAX_BYTES`` are dropped as they arrive and the field gets
+an empty file, which ``PostForm`` rejects. Image
+dimensions are checked from the header, before any decoding. EXIF data
+is stripped and the resolution capped by ``normalize``, which runs in
+the thumbnail pool after the post is saved.
+"""
+import logging
+import resource
+import time
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_kb():
+    """Peak resident memory of the process so far (KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class OversizeUpload(SimpleUploadedFile):
+    """An empty stand-in for a file over the size limit."""
+
+    def __init__(self, name, content_type, received):
+        super().__init__(name, b'', content_type)
+        self.received = received
+
+
+class SizeLimitedUploadHandler(FileUploadHandler):
+    """Counts the bytes of each file. It must come before the handler
+    that writes the file, so that the extra chunks never reach it.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.started = time.perf_counter()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_BYTES:
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        oversize = self.received > settings.POST_IMAGE_MAX_BYTES
+        logger.info(
+            'upload %s: %d bytes in %.3f s%s, peak rss %d KiB',
+            self.file_name,
+            self.received,
+            time.perf_counter() - self.started,
+            ' (rejected: too large)' if oversize else '',
+            peak_rss_kb(),
+        )
+        if oversize:
+            return OversizeUpload(
+                self.file_name, self.content_type, self.received
+            )
+        return None
+
+
+def limit_upload_size(view):
+    """Put ``SizeLimitedUploadHandler`` in front of the upload handlers
+    for ``view``. The handlers must be set before the body is read,
+    and ``CsrfViewMiddleware`` reads it, so the CSRF check moves inside.
+    """
+
+    protected = csrf_protect(view)
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        request.upload_handlers.insert(0, SizeLimitedUploadHandler(request))
+        return protected(request, *args, **kwargs)
+
+    return csrf_exempt(wrapped)
+
+
+def check_dimensions(image):
+    """Reject an image with too many pixels. ``image`` is the
+    Pillow image that ``forms.ImageField`` opened without decoding.
+    """
+
+    width, height = image.size
+    return width * height <= settings.POST_IMAGE_MAX_PIXELS
+
+
+def normalize(name):
+    """Strip EXIF (applying its orientation first) and cap the
+    resolution of a stored image. The result is saved under a new
+    name, which is returned (``name`` itself if there was nothing to
+    do): the original stays until the caller has moved the post to
+    the copy, so the image never goes missing in between.
+    """
+
+    started = time.perf_counter()
+    rss_before = peak_rss_kb()
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    with default_storage.open(name, 'rb') as stored:
+        image = Image.open(stored)
+        if getattr(image, 'is_animated', False):
+            return name
+        image_format = image.format
+        has_exif = bool(image.info.get('exif'))
+        if not has_exif and max(image.size) <= max_side:
+            return name
+        # For JPEG the decoder scales down while decoding.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.info.pop('exif', None)
+        image.thumbnail((max_side, max_side))
+        output = BytesIO()
+        image.save(output, image_format, quality=85)
+    # The original still exists, so the storage picks a free name.
+    saved = default_storage.save(name, ContentFile(output.getvalue()))
+    logger.info(
+        'normalize %s -> %s: %dx%d in %.3f s, peak rss %d KiB (+%d)',
+        name,
+        saved,
+        image.width,
+        image.height,
+        time.perf_counter() - started,
+        peak_rss_kb(),
+        peak_rss_kb() - rss_before,
+    )
+    return saved
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 
 urlpatterns = [
@@ -14,6 +14,16 @@ urlpatterns = [
         views.group_posts,
         name='group_post'
     ),
+    path(
+        'group/<slug:slug>/feed/',
+        feeds.group_rss,
+        name='group_feed'
+    ),
+    path(
+        'group/<slug:slug>/feed/atom/',
+        feeds.group_atom,
+        name='group_feed_atom'
+    ),
     path(
         'new/',
         views.new_post,
@@ -24,11 +34,31 @@ urlpatterns = [
         views.follow_index,
         name='follow_index'
     ),
+    path(
+        'search/',
+        views.search_posts,
+        name='search'
+    ),
+    path(
+        'export/',
+        views.export_posts,
+        name='export_posts'
+    ),
     path(
         '<str:username>/',
         views.profile,
         name='profile'
     ),
+    path(
+        '<str:username>/feed/',
+        feeds.author_rss,
+        name='profile_feed'
+    ),
+    path(
+        '<str:username>/feed/atom/',
+        feeds.author_atom,
+        name='profile_feed_atom'
+    ),
     path(
         '<str:username>/follow/',
         views.profile_follow,
@@ -44,6 +74,11 @@ urlpatterns = [
         views.post_view,
         name='post'
     ),
+    path(
+        '<str:username>/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         '<str:username>/<int:post_id>/edit/',
         views.post_edit,
@@ -1,16 +1,28 @@
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import (
+    HttpResponseBadRequest, JsonResponse, StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 
+from posts import cards, conditional, export, search, thumbnails, uploads
 from posts.forms import CommentForm, PostForm
-from posts.models import Follow, Group, Post, User
+from posts.models import Follow, Group, Post, User, UserStats
+from posts.paginator import CursorPaginator, InvalidCursor
+from posts.timeline import follow_feed
 
 
+@conditional.conditional_page(conditional.index_scopes)
 def index(request):
-    latest = Post.objects.all()
-    paginator = Paginator(latest, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    latest = Post.objects.feed()
+    paginator = CursorPaginator(latest, 10)
+    page = paginator.get_page(request.GET.get('cursor'))
+    page.object_list = cards.attach_versions(
+        page.object_list, request.user
+    )
     return render(
         request,
         'index.html',
@@ -18,12 +30,15 @@ def index(request):
     )
 
 
+@conditional.conditional_page(conditional.group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = group.posts.feed()
+    paginator = CursorPaginator(posts, 10)
+    page = paginator.get_page(request.GET.get('cursor'))
+    page.object_list = cards.attach_versions(
+        page.object_list, request.user
+    )
     return render(
         request,
         'group.html',
@@ -31,33 +46,114 @@ def group_posts(request, slug):
     )
 
 
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    page = None
+    if query:
+        paginator = search.paginator(query, 10)
+        page = paginator.get_page(request.GET.get('cursor'))
+        page.object_list = cards.attach_versions(
+            page.object_list, request.user
+        )
+    return render(
+        request,
+        'search.html',
+        {'query': query, 'page': page},
+    )
+
+
+@conditional.conditional_page(conditional.profile_scopes)
 def profile(request, username):
     user = get_object_or_404(User, username=username)
-    posts = user.posts.all()
+    posts = user.posts.feed()
     following = request.user.is_authenticated and Follow.objects.filter(
         user=request.user, author=user
     ).exists()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
-    context = {'profile': user, 'page': page, 'following': following}
+    paginator = CursorPaginator(posts, 10)
+    page = paginator.get_page(request.GET.get('cursor'))
+    page.object_list = cards.attach_versions(
+        page.object_list, request.user
+    )
+    context = {
+        'profile': user,
+        'stats': UserStats.objects.for_user(user),
+        'page': page,
+        'following': following,
+    }
     return render(request, 'profile.html', context)
 
 
+@conditional.conditional_page(conditional.post_scopes)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
+    post = get_object_or_404(
+        Post.objects.feed(full_text=True),
+        author__username=username,
+        id=post_id,
+    )
+    cards.attach_versions([post], request.user, full_text=True)
     form = CommentForm()
-    comments = post.comments.all()
+    paginator = comment_paginator(post)
+    comment_page = paginator.get_page(request.GET.get('cursor'))
     context = {
         'profile': post.author,
+        'stats': UserStats.objects.for_user(post.author),
         'post': post,
         'form': form,
-        'comments': comments
+        # A queryset of the batch on the page, not of the whole thread.
+        'comments': paginator.object_list.filter(
+            pk__in=[comment.pk for comment in comment_page]
+        ),
+        'comment_page': comment_page,
     }
     return render(request, 'post.html', context)
 
 
+def comment_paginator(post):
+    return CursorPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        ordering=('created', 'id'),
+    )
+
+
+@conditional.conditional_page(conditional.post_scopes)
+def post_comments(request, username, post_id):
+    """The next batch of comments after ``cursor``: an HTML
+    fragment for the post page, or JSON with ``format=json``.
+    """
+
+    post = get_object_or_404(
+        Post.objects.select_related('author'),
+        author__username=username,
+        id=post_id,
+    )
+    try:
+        page = comment_paginator(post).page(request.GET.get('cursor'))
+    except InvalidCursor as error:
+        return HttpResponseBadRequest(str(error))
+    if request.GET.get('format') != 'json':
+        return render(
+            request,
+            'includes/comment_list.html',
+            {'post': post, 'comment_page': page},
+        )
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': comment.created,
+            }
+            for comment in page
+        ],
+        'next_cursor': page.next_cursor,
+    })
+
+
+@uploads.limit_upload_size
 @login_required
+@transaction.atomic
 def new_post(request):
     form = PostForm()
     if request.method == 'POST':
@@ -66,10 +162,12 @@ def new_post(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            thumbnails.enqueue(post)
             return redirect('index')
     return render(request, 'new.html', {'form': form})
 
 
+@uploads.limit_upload_size
 @login_required
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
@@ -83,7 +181,9 @@ def post_edit(request, username, post_id):
             request.POST, files=request.FILES or None, instance=post
         )
         if form.is_valid():
-            form.save()
+            post = form.save()
+            if 'image' in form.changed_data:
+                thumbnails.enqueue(post)
             return redirect('post', username=username, post_id=post.id)
     return render(
         request,
@@ -92,6 +192,7 @@ def post_edit(request, username, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id, username):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
@@ -107,12 +208,16 @@ def add_comment(request, post_id, username):
 def follow_index(request):
     """The posts of the authors to which the user is subscribed
     are displayed.
+    The page keeps Django's numbered Paginator/Page contract.
     """
 
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = follow_feed(request.user)
     paginator = Paginator(posts, 10)
     page_number = request.GET.get('page')
     page = paginator.get_page(page_number)
+    page.object_list = cards.attach_versions(
+        page.object_list, request.user
+    )
     return render(
         request,
         'follow.html',
@@ -121,6 +226,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     follower = get_object_or_404(User, username=username)
     if request.user != follower:
@@ -129,6 +235,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
@@ -136,6 +243,29 @@ def profile_unfollow(request, username):
     return redirect('profile', username=username)
 
 
+@staff_member_required
+def export_posts(request):
+    """Streaming snapshot for analytics, see ``posts.export``."""
+    fmt = request.GET.get('format', 'jsonl')
+    types = request.GET.getlist('type') or export.TYPES
+    if fmt not in export.FORMATS or not set(types) <= set(export.TYPES):
+        return HttpResponseBadRequest('Неизвестный формат или тип')
+    since = request.GET.get('since')
+    try:
+        since = export.parse_since(since) if since else None
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    lines, content_type = export.FORMATS[fmt]
+    response = StreamingHttpResponse(
+        lines(export.records(types, since)),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-export.{fmt}"'
+    )
+    return response
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -0,0 +1,336 @@
+"""Cache backends for running several worker processes on one host.
+
+``SQLiteCache`` keeps entries in a SQLite file that all workers share,
+so a fragment rendered by one worker is reused by the others, with no
+extra service to run. ``TwoTierCache`` puts a bounded in-process LRU in
+front of another cache alias: hot keys are served from memory, and an
+entry changed by another worker is seen after ``LOCAL_TIMEOUT`` seconds
+at most.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """``LOCATION`` is the path of the SQLite file."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        # A connection must not cross a fork, so it is kept per process
+        # and per thread.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),),
+        ).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        rows = self._connection().execute(
+            'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+            % ', '.join('?' * len(made)),
+            list(made),
+        ).fetchall()
+        return {
+            made[key]: pickle.loads(value)
+            for key, value, expires in rows if self._alive(expires)
+        }
+
+    def _write(self, key, value, timeout, version, replace):
+        key = self._key(key, version)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self.get_backend_timeout(timeout)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            if not replace:
+                connection.execute(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    (key, time.time()),
+                )
+            written = connection.execute(
+                'INSERT OR %s INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)' % ('REPLACE' if replace else 'IGNORE'),
+                (key, data, expires),
+            ).rowcount
+            if written:
+                self._cull(connection)
+        return bool(written)
+
+    def _cull(self, connection):
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE rowid IN ('
+                'SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                (count // self._cull_frequency or 1,),
+            )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(key, value, timeout, version, replace=True)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._write(key, value, timeout, version, replace=False)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        with connection:
+            return bool(connection.execute(
+                'UPDATE cache SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (
+                    self.get_backend_timeout(timeout),
+                    self._key(key, version),
+                    time.time(),
+                ),
+            ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1]):
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        return value
+
+    def delete(self, key, version=None):
+        connection = self._connection()
+        with connection:
+            return bool(connection.execute(
+                'DELETE FROM cache WHERE key = ?', (self._key(key, version),)
+            ).rowcount)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Called at the end of every request: the connection is kept.
+        pass
+
+
+class LocalLRU:
+    """Thread-safe LRU of ``key -> (value, expires)`` with counters."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TwoTierCache(BaseCache):
+    """In-process LRU in front of a shared cache.
+
+    ``LOCATION`` is the alias of the shared cache. ``OPTIONS``:
+    ``MAX_ENTRIES`` bounds the local tier, ``LOCAL_TIMEOUT`` is how long
+    (seconds) a value may be served locally without asking the shared
+    tier again.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._shared_alias = location
+        options = params.get('OPTIONS', {})
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._memory = LocalLRU(self._max_entries)
+        self._stats_lock = threading.Lock()
+        self._hits = {'local': 0, 'shared': 0, 'misses': 0}
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _count(self, name, number=1):
+        with self._stats_lock:
+            self._hits[name] += number
+
+    def _remember(self, key, value, version):
+        self._memory.set(
+            self.shared.make_key(key, version=version),
+            value,
+            self._local_timeout,
+        )
+
+    def _forget(self, key, version):
+        self._memory.discard(self.shared.make_key(key, version=version))
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._hits)
+        stats.update(
+            size=len(self._memory),
+            max_entries=self._memory.max_entries,
+            evictions=self._memory.evictions,
+        )
+        return stats
+
+    def get(self, key, default=None, version=None):
+        value = self._memory.get(self.shared.make_key(key, version=version))
+        if value is not MISSING:
+            self._count('local')
+            return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._count('misses')
+            return default
+        self._count('shared')
+        self._remember(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, rest = {}, []
+        for key in keys:
+            value = self._memory.get(
+                self.shared.make_key(key, version=version)
+            )
+            if value is MISSING:
+                rest.append(key)
+            else:
+                found[key] = value
+        self._count('local', len(found))
+        if rest:
+            fetched = self.shared.get_many(rest, version=version)
+            for key, value in fetched.items():
+                self._remember(key, value, version)
+            self._count('shared', len(fetched))
+            self._count('misses', len(rest) - len(fetched))
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, value, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._remember(key, value, version)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, version)
+        else:
+            self._forget(key, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._remember(key, value, version)
+        return value
+
+    def delete(self, key, version=None):
+        self._forget(key, version)
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._forget(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        self._memory.clear()
+        self.shared.clear()
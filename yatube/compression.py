@@ -0,0 +1,116 @@
+"""Compression of the HTML, JSON and feed responses.
+
+``CompressionMiddleware`` encodes a response with the best coding the
+client accepts: br when the optional ``brotli`` package is installed,
+otherwise gzip. Only ``COMPRESS_TYPES`` are touched, bodies shorter than
+``COMPRESS_MIN_SIZE`` are sent as they are, and a strong ETag becomes
+weak, so that ``If-None-Match`` still matches the pages of
+``posts.conditional`` and ``posts.pagecache``. The middleware sits
+outside the page cache: a cached page is kept once, uncompressed.
+"""
+import gzip
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it everything is gzipped.
+    brotli = None
+
+
+def accepted_codings(request):
+    """Content codings of ``Accept-Encoding``, without ``q=0`` ones."""
+    codings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = item.split(';')
+        coding = coding.strip().lower()
+        refused = False
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    refused = float(value) <= 0
+                except ValueError:
+                    refused = True
+        if coding and not refused:
+            codings.add(coding)
+    return codings
+
+
+def preferred_coding(request):
+    codings = accepted_codings(request)
+    if brotli is not None and 'br' in codings:
+        return 'br'
+    if 'gzip' in codings or '*' in codings:
+        return 'gzip'
+    return None
+
+
+def compress(data, coding):
+    if coding == 'br':
+        return brotli.compress(data, quality=settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=settings.COMPRESS_LEVEL, mtime=0)
+
+
+def compress_stream(chunks, coding):
+    if coding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESS_BROTLI_QUALITY
+        )
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(
+            settings.COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip()
+    return (
+        content_type in settings.COMPRESS_TYPES
+        and not response.has_header('Content-Encoding')
+    )
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        if not settings.COMPRESS_RESPONSES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not compressible(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = preferred_coding(request)
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, coding
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < settings.COMPRESS_MIN_SIZE:
+                return response
+            compressed = compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = f'W/{etag}'
+        response['Content-Encoding'] = coding
+        return response
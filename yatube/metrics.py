@@ -0,0 +1,240 @@
+"""Per-view request metrics without ``DEBUG``.
+
+``RequestMetricsMiddleware`` counts the queries of a request with
+``execute_wrapper`` (nothing is kept per query), measures DB time,
+template render time (which includes the queries of lazy querysets
+evaluated by the template) and response size, and sends them to staff
+users as a ``Server-Timing`` header. Every sample goes into log-scale
+histograms per URL name, rotated every ``REQUEST_METRICS_WINDOW``
+seconds, so the percentiles cover the last one or two windows. Each
+worker copies its histograms to the cache every
+``REQUEST_METRICS_FLUSH`` seconds, and ``report`` merges the copies of
+all workers. With ``REQUEST_METRICS = False`` the middleware removes
+itself from the chain.
+"""
+import math
+import os
+import socket
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+# Log-scale buckets: a reported percentile is at most 10% too high.
+SMALLEST = 0.1
+FACTOR = 1.1
+
+WORKERS_KEY = 'request_metrics:workers'
+
+_local = threading.local()
+
+
+def bucket(value):
+    if value <= SMALLEST:
+        return 0
+    return math.ceil(math.log(value / SMALLEST, FACTOR))
+
+
+def upper_bound(index):
+    return SMALLEST * FACTOR ** index
+
+
+def percentile(histogram, fraction):
+    rank = fraction * sum(histogram.values())
+    seen = 0
+    for index in sorted(histogram):
+        seen += histogram[index]
+        if seen >= rank:
+            return round(upper_bound(index), 1)
+    return None
+
+
+def merge(target, snapshot):
+    for name, histograms in snapshot.items():
+        merged = target.setdefault(name, {})
+        for metric, histogram in histograms.items():
+            merged.setdefault(metric, Counter()).update(histogram)
+    return target
+
+
+class Recorder:
+    """Histograms of one worker process: the current window
+    and the previous one.
+    """
+
+    def __init__(self):
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._current, self._previous = {}, {}
+            self._rotated = self._flushed = time.monotonic()
+
+    def add(self, name, sample):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._rotated >= settings.REQUEST_METRICS_WINDOW:
+                self._previous, self._current = self._current, {}
+                self._rotated = now
+            histograms = self._current.setdefault(name, {})
+            for metric, value in sample.items():
+                histograms.setdefault(metric, Counter())[bucket(value)] += 1
+            flush = now - self._flushed >= settings.REQUEST_METRICS_FLUSH
+            if flush:
+                self._flushed = now
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return merge(merge({}, self._previous), self._current)
+
+    def flush(self):
+        """Share the histograms of this worker through the cache."""
+        timeout = 2 * settings.REQUEST_METRICS_WINDOW
+        cache.set(self.key(self.worker), self.snapshot(), timeout)
+        workers = set(cache.get(WORKERS_KEY, ()))
+        alive = cache.get_many([self.key(worker) for worker in workers])
+        workers = {
+            worker for worker in workers if self.key(worker) in alive
+        }
+        cache.set(WORKERS_KEY, workers | {self.worker}, timeout)
+
+    @staticmethod
+    def key(worker):
+        return f'request_metrics:{worker}'
+
+
+recorder = Recorder()
+
+
+def report():
+    """``{url name: {'requests': n, metric: {p50, p95, p99}}}``
+    over all workers that flushed recently.
+    """
+
+    workers = set(cache.get(WORKERS_KEY, ())) - {recorder.worker}
+    snapshots = cache.get_many([recorder.key(worker) for worker in workers])
+    merged = merge({}, recorder.snapshot())
+    for snapshot in snapshots.values():
+        merge(merged, snapshot)
+    result = {}
+    for name, histograms in sorted(merged.items()):
+        result[name] = {
+            'requests': sum(histograms['total_ms'].values()),
+            **{
+                metric: {
+                    label: percentile(histogram, fraction)
+                    for label, fraction in PERCENTILES.items()
+                }
+                for metric, histogram in histograms.items()
+            },
+        }
+    return result
+
+
+class Timing:
+    """Measurements of the current request."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.template = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # ``execute_wrapper`` hook, called for every query.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - started
+
+
+def current_timing():
+    return getattr(_local, 'timing', None)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = _local.timing = Timing()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _local.timing = None
+        total = time.perf_counter() - started
+        sample = {
+            'total_ms': total * 1000,
+            'db_ms': timing.db * 1000,
+            'template_ms': timing.template * 1000,
+            'queries': timing.queries,
+        }
+        if not response.streaming:
+            sample['bytes'] = len(response.content)
+        match = request.resolver_match
+        recorder.add(match.view_name if match else '-', sample)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = (
+                f'db;dur={sample["db_ms"]:.1f};desc="{timing.queries} '
+                f'queries", tpl;dur={sample["template_ms"]:.1f}, '
+                f'total;dur={sample["total_ms"]:.1f}'
+            )
+        return response
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        timing = current_timing()
+        if timing is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timing.template += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """The Django template backend that also times
+    every render for ``RequestMetricsMiddleware``.
+    """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+@staff_member_required
+def report_view(request):
+    return JsonResponse({
+        'window': settings.REQUEST_METRICS_WINDOW,
+        'views': report(),
+    })
@@ -0,0 +1,144 @@
+"""Read replicas for the feed pages.
+
+``ReplicaMiddleware`` lets the GET requests of ``REPLICA_VIEWS`` read
+from one of ``DATABASE_REPLICAS``, picked once per request; everything
+else, and every write, goes to ``default``. A request that saves or
+deletes a model gets a cookie that keeps its client on ``default`` for
+``REPLICA_PIN_SECONDS``, longer than the replicas lag behind, so users
+see their own posts, comments and follows at once; incidental writes of
+the replica views themselves (a ``UserStats`` row created on a read)
+do not pin. Reads after a write in the same request also go to
+``default``.
+
+Whatever syncs a replica records with ``mark_synced`` the time before
+which it has every commit. The page and card versions of
+``posts.conditional`` and ``posts.cards`` are times of commits too, so
+a request switches to ``default`` (``require``) before a page is
+cached or tagged with a version its replica may not have yet.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import pre_delete, pre_save
+from django.dispatch import receiver
+from django.urls import Resolver404, resolve
+
+PIN_COOKIE = 'primary_pin'
+
+_local = threading.local()
+
+
+def current():
+    """The replica of the running request, or ``None``."""
+    return getattr(_local, 'replica', None)
+
+
+def synced_key(alias):
+    return f'replica_synced:{alias}'
+
+
+def mark_synced(alias, stamp):
+    """Record that ``alias`` has every commit made before ``stamp``,
+    a ``time.time_ns()``.
+    """
+
+    cache.set(synced_key(alias), stamp, None)
+
+
+def behind(stamp):
+    """Whether the replica of the running request may miss a commit
+    made at ``stamp``. Never synced counts as behind.
+    """
+
+    replica = current()
+    if replica is None:
+        return False
+    synced = getattr(_local, 'synced', None)
+    if synced is None:
+        synced = _local.synced = cache.get(synced_key(replica), 0)
+    return stamp > synced
+
+
+def require(stamp):
+    """Read from ``default`` for the rest of the request if its replica
+    may miss a commit made at ``stamp``.
+    """
+
+    if behind(stamp):
+        _local.replica = None
+
+
+@receiver(pre_save, dispatch_uid='replicas_pin')
+@receiver(pre_delete, dispatch_uid='replicas_pin_delete')
+def pin(**kwargs):
+    _local.replica = None
+    _local.wrote = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        # A session that has not reached a replica yet would log the
+        # user out.
+        if model._meta.app_label == 'sessions':
+            return None
+        return current()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of default, see sync_replicas.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def replica_view(request):
+    """Whether the request is a read of one of ``REPLICA_VIEWS``."""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return False
+    return match.url_name in settings.REPLICA_VIEWS
+
+
+def reads_from_replica(request):
+    return (
+        bool(settings.DATABASE_REPLICAS)
+        and PIN_COOKIE not in request.COOKIES
+        and replica_view(request)
+    )
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        _local.synced = None
+        if reads_from_replica(request):
+            _local.replica = random.choice(settings.DATABASE_REPLICAS)
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.replica = _local.synced = None
+        # Follows and unfollows are GET links, but not of the feeds.
+        if _local.wrote and not replica_view(request):
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -27,7 +28,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'yatube.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'yatube.compression.CompressionMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
+    'posts.pagecache.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -39,12 +44,38 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Keep parsed templates in memory (the cached loader) and parse
+# PRELOAD_TEMPLATES when yatube.wsgi starts, before the first request.
+# Off with DEBUG, so that edited templates show up without a restart;
+# YATUBE_TEMPLATE_CACHE=1 turns it on anyway, 0 turns it off.
+TEMPLATE_CACHE = os.environ.get(
+    'YATUBE_TEMPLATE_CACHE', '0' if DEBUG else '1'
+) != '0'
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+PRELOAD_TEMPLATES = (
+    'index.html', 'group.html', 'profile.html', 'post.html', 'follow.html',
+    'search.html', 'base.html', 'includes/post_item.html',
+    'includes/nav.html', 'includes/menu.html', 'includes/footer.html',
+    'includes/paginator.html', 'includes/card_user.html',
+    'includes/comments.html', 'includes/comment_list.html',
+)
+
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django templates, with render time for yatube.metrics.
+        'BACKEND': 'yatube.metrics.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': (
+                [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                if TEMPLATE_CACHE else TEMPLATE_LOADERS
+            ),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -57,13 +88,70 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# SQLite profile of the environment, chosen with YATUBE_DB:
+# 'stock' - the stock backend: rollback journal, a connection per request;
+# 'tuned' - WAL, mmap, a bigger page cache, synchronous=NORMAL, a busy
+#           timeout, write transactions started IMMEDIATE and connections
+#           kept by the workers. Compare with manage.py db_benchmark.
+DATABASE_PROFILE = os.environ.get('YATUBE_DB', 'stock')
+
+DATABASE_PROFILES = {
+    'stock': {
+        'ENGINE': 'django.db.backends.sqlite3',
+    },
+    'tuned': {
+        'ENGINE': 'yatube.sqlite',
+        'CONN_MAX_AGE': 600,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,  # KiB
+                'temp_store': 'MEMORY',
+            },
+        },
+    },
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        'NAME': os.environ.get(
+            'YATUBE_DB_NAME', os.path.join(BASE_DIR, 'db.sqlite3')
+        ),
     }
 }
 
+# Read replicas (yatube.replicas): YATUBE_DB_REPLICAS is a comma-separated
+# list of SQLite files, copied from default by manage.py sync_replicas.
+DATABASE_REPLICAS = []
+
+for number, name in enumerate(
+    filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')), 1
+):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+        'NAME': os.path.join(BASE_DIR, name.strip()),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+
+# Read-only views (URL names) served from the replicas.
+REPLICA_VIEWS = (
+    'index', 'group_post', 'profile', 'post', 'follow_index',
+    'group_feed', 'group_feed_atom', 'profile_feed', 'profile_feed_atom',
+    'api_posts', 'api_group_posts', 'api_profile_posts', 'api_post',
+    'api_post_comments', 'api_follow_posts',
+)
+
+# How long a client that wrote keeps reading from default, seconds.
+REPLICA_PIN_SECONDS = 10
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -93,18 +181,153 @@ STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+# collectstatic writes hashed names and .gz/.br copies, see
+# yatube.staticfiles.
+STATICFILES_STORAGE = (
+    'yatube.staticfiles.CompressedManifestStaticFilesStorage'
+)
+
+COMPRESS_STATIC_EXTENSIONS = (
+    '.css', '.js', '.map', '.svg', '.txt', '.json', '.xml', '.html',
+)
+
+# Serve STATIC_ROOT from Django, picking the precompressed copies, where
+# no front server does it. YATUBE_SERVE_STATIC=1 adds the URL.
+SERVE_STATIC = os.environ.get('YATUBE_SERVE_STATIC', '0') != '0'
+
 MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Thumbnails built in the background for every post image,
+# geometry -> sorl-thumbnail options.
+POST_THUMBNAIL_SIZES = {
+    '960x339': {'crop': 'center', 'upscale': True},
+}
+
+THUMBNAIL_WORKERS = 2
+
+# Uploads always go to a temporary file, in chunks. The post form views
+# also cap their size, see posts.uploads.limit_upload_size.
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_BYTES = 10 * 2**20
+
+# Checked from the image header, before decoding.
+POST_IMAGE_MAX_PIXELS = 40 * 10**6
+
+# Longer side of a stored post image after normalization.
+POST_IMAGE_MAX_SIDE = 2560
+
+# Part of every page ETag (posts.conditional): a new release must not
+# be answered with 304 for pages rendered by the old templates.
+RELEASE = os.environ.get('YATUBE_RELEASE', 'dev')
+
 LOGIN_URL = '/auth/login/'
 
 LOGIN_REDIRECT_URL = 'index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# Cache profile of the environment, chosen with YATUBE_CACHE:
+# 'local'  - in-process memory, for development and tests;
+# 'shared' - one SQLite file shared by all workers of the host;
+# 'tiered' - in-process LRU in front of the shared file.
+CACHE_PROFILE = os.environ.get('YATUBE_CACHE', 'local')
+
+SHARED_CACHE = {
+    'BACKEND': 'yatube.cache.SQLiteCache',
+    'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared.sqlite3'),
+    'OPTIONS': {'MAX_ENTRIES': 100000},
+}
+
+CACHE_PROFILES = {
+    'local': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'shared': {
+        'default': SHARED_CACHE,
+    },
+    'tiered': {
+        'default': {
+            'BACKEND': 'yatube.cache.TwoTierCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {'MAX_ENTRIES': 5000, 'LOCAL_TIMEOUT': 5},
+        },
+        'shared': SHARED_CACHE,
+    },
 }
+
+CACHES = CACHE_PROFILES[CACHE_PROFILE]
+
+# /follow/ timeline: authors with at least this many followers are merged
+# in on read instead of being copied to every follower on publish.
+TIMELINE_FANOUT_LIMIT = 10000
+
+# How many of the latest posts are copied on follow.
+TIMELINE_BACKFILL = 1000
+
+# Admin changelists count exactly up to this many rows, see
+# posts.admin.EstimatedCountPaginator.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Posts in the RSS/Atom feed of a group or an author (posts.feeds).
+FEED_ITEMS = 20
+
+# Posts in one page of the JSON API (posts.api).
+API_PAGE_SIZE = 20
+
+# Comments shown on the post page and loaded by one "more" request.
+COMMENTS_PER_PAGE = 50
+
+# Compression of responses (yatube.compression): br with the brotli
+# package installed, gzip otherwise. YATUBE_COMPRESS=0 removes the
+# middleware.
+COMPRESS_RESPONSES = os.environ.get('YATUBE_COMPRESS', '1') != '0'
+
+COMPRESS_TYPES = (
+    'text/html', 'application/json', 'application/rss+xml',
+    'application/atom+xml', 'text/csv', 'application/x-ndjson',
+)
+
+# Shorter bodies are sent as they are, bytes.
+COMPRESS_MIN_SIZE = 512
+
+# gzip level (1-9) and brotli quality (0-11) of responses; collectstatic
+# compresses the static files at the highest ones.
+COMPRESS_LEVEL = 6
+
+COMPRESS_BROTLI_QUALITY = 5
+
+# Per-view request metrics (yatube.metrics): Server-Timing for staff and
+# p50/p95/p99 at /metrics/. YATUBE_METRICS=0 removes the middleware.
+REQUEST_METRICS = os.environ.get('YATUBE_METRICS', '1') != '0'
+
+# Length of a histogram window and how often a worker shares it, seconds.
+REQUEST_METRICS_WINDOW = 300
+
+REQUEST_METRICS_FLUSH = 10
+
+# Full-page cache of the feed and post pages for visitors without a
+# session (posts.pagecache). YATUBE_PAGE_CACHE=0 removes the middleware.
+# It is off under manage.py test and pytest: a test's transaction is
+# rolled back, so the on_commit signals that move the page versions never
+# run and a page cached in one test would be served in the next one.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
+PAGE_CACHE = os.environ.get(
+    'YATUBE_PAGE_CACHE', '0' if TESTING else '1'
+) != '0'
+
+# How long a cached page is served without a check, and how long after
+# that it may still be served while one request renders it again.
+PAGE_CACHE_TIMEOUT = 60
+
+PAGE_CACHE_STALE = 300
+
+# Longest render the other requests wait for, seconds.
+PAGE_CACHE_LOCK_TIMEOUT = 10
@@ -0,0 +1,32 @@
+"""SQLite backend for several worker processes.
+
+The stock backend with two more ``OPTIONS``:
+
+``pragmas`` are run on every new connection, e.g. ``journal_mode=WAL``
+so that readers no longer wait for a writer, or ``mmap_size``;
+``transaction_mode`` is how ``atomic`` starts a transaction. With
+``IMMEDIATE`` it takes the write lock at once and waits for it up to
+``timeout``, instead of failing with "database is locked" when
+a read transaction of a busy database has to turn into a write one.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
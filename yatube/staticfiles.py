@@ -0,0 +1,114 @@
+"""Hashed and precompressed static files.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes
+every file under a name with its content hash, as
+``ManifestStaticFilesStorage`` does, and puts a ``.gz`` (and, with the
+optional ``brotli`` package, a ``.br``) copy next to each text file, at
+the highest levels, once per deploy. A front server serves the copies
+itself (``gzip_static``/``brotli_static`` in nginx); ``serve`` is the
+same for a deployment without one, enabled by ``SERVE_STATIC``.
+"""
+import gzip
+import mimetypes
+import posixpath
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, staticfiles_storage,
+)
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from yatube.compression import accepted_codings, brotli
+
+# coding -> suffix of the precompressed copy, the preferred one first
+VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+# A hashed name never changes its content.
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Before the first collectstatic there is no manifest, and the
+        # files are served under their own names.
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # The originals are collected too, under their own names.
+        names = [*self.hashed_files, *self.hashed_files.values()]
+        for name in dict.fromkeys(names):
+            for compressed in self.compress(name):
+                yield name, compressed, True
+
+    def compress(self, name):
+        """Write the compressed copies of ``name`` worth keeping."""
+        if not name.endswith(settings.COMPRESS_STATIC_EXTENSIONS):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < settings.COMPRESS_MIN_SIZE:
+            return
+        encoders = {'gzip': lambda: gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            encoders['br'] = lambda: brotli.compress(data, quality=11)
+        for coding, suffix in VARIANTS:
+            if coding not in encoders:
+                continue
+            compressed = encoders[coding]()
+            if len(compressed) < len(data) * 0.95:
+                Path(self.path(name + suffix)).write_bytes(compressed)
+                yield name + suffix
+
+
+def is_hashed(name):
+    hashed_files = getattr(staticfiles_storage, 'hashed_files', {})
+    return name in hashed_files.values()
+
+
+def serve(request, path):
+    """A file of ``STATIC_ROOT``, as its precompressed copy if the
+    client accepts it, cached for good under a hashed name.
+    """
+
+    path = posixpath.normpath(path).lstrip('/')
+    fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    if not fullpath.is_file():
+        raise Http404(f'"{path}" не найден')
+    content_type, _ = mimetypes.guess_type(str(fullpath))
+    codings = accepted_codings(request)
+    coding = None
+    for variant, suffix in VARIANTS:
+        candidate = fullpath.with_name(fullpath.name + suffix)
+        if variant in codings and candidate.is_file():
+            coding, fullpath = variant, candidate
+            break
+    stat = fullpath.stat()
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            fullpath.open('rb'),
+            content_type=content_type or 'application/octet-stream',
+        )
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if coding:
+            response['Content-Encoding'] = coding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if is_hashed(path):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True
+        )
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
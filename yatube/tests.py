@@ -0,0 +1,477 @@
+import gzip
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import Counter
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts import cards
+from posts.models import Post
+from yatube import compression, metrics, replicas, staticfiles
+from yatube.cache import SQLiteCache
+from yatube.sqlite.base import DatabaseWrapper
+
+User = get_user_model()
+
+# Workers are forked, as gunicorn does it.
+FORK = multiprocessing.get_context('fork')
+
+
+def shared_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def worker_set(path, number):
+    cache = shared_cache(path)
+    cache.set(f'from-worker-{number}', cache.get('from-parent'))
+
+
+def worker_incr(path, times, number):
+    cache = shared_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+def run_workers(target, *args, count=4):
+    workers = [
+        FORK.Process(target=target, args=args + (number,))
+        for number in range(count)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    return [worker.exitcode for worker in workers]
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        self.cache = shared_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_entries_are_shared_between_processes(self):
+        self.cache.set('from-parent', {'card': '<div>'})
+        self.assertEqual(run_workers(worker_set, self.path), [0] * 4)
+        self.assertEqual(
+            self.cache.get_many([f'from-worker-{n}' for n in range(4)]),
+            {f'from-worker-{n}': {'card': '<div>'} for n in range(4)},
+        )
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        self.assertEqual(
+            run_workers(worker_incr, self.path, 50), [0] * 4
+        )
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_add_expiry_and_delete(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+        self.cache.set('short', 1, timeout=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertTrue(self.cache.delete('key'))
+        self.assertFalse(self.cache.has_key('key'))
+
+    def test_size_is_bounded(self):
+        cache = shared_cache(self.path, MAX_ENTRIES=10, CULL_FREQUENCY=2)
+        for number in range(30):
+            cache.set(number, number)
+        self.assertLessEqual(len(cache.get_many(range(30))), 11)
+        self.assertEqual(cache.get(29), 29)
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = f'{self.directory}/cache.sqlite3'
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'yatube.cache.TwoTierCache',
+                'LOCATION': 'shared',
+                'OPTIONS': {'MAX_ENTRIES': 2, 'LOCAL_TIMEOUT': 0.2},
+            },
+            'shared': {
+                'BACKEND': 'yatube.cache.SQLiteCache',
+                'LOCATION': self.path,
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.cache = caches['default']
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_local_tier_hits_and_evictions(self):
+        for key in ('a', 'b', 'c'):
+            self.cache.set(key, key)
+        self.assertEqual(self.cache.get('c'), 'c')
+        self.assertEqual(self.cache.get('a'), 'a')
+        self.assertIsNone(self.cache.get('missing'))
+        stats = self.cache.stats()
+        self.assertEqual(stats['local'], 1)
+        self.assertEqual(stats['shared'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 2)
+
+    def test_other_worker_write_is_seen_after_local_timeout(self):
+        self.cache.set('from-parent', 'old')
+        self.assertEqual(self.cache.get('from-parent'), 'old')
+        shared_cache(self.path).set('from-parent', 'new')
+        self.assertEqual(self.cache.get('from-parent'), 'old')
+        time.sleep(0.3)
+        self.assertEqual(self.cache.get('from-parent'), 'new')
+
+    def test_delete_reaches_both_tiers(self):
+        self.cache.set('key', 1)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(caches['shared'].get('key'))
+
+
+class RequestMetricsTest(TestCase):
+    """Per-view metrics from ``yatube.metrics``."""
+
+    def setUp(self):
+        cache.clear()
+        metrics.recorder.clear()
+        self.staff = User.objects.create_user(username='Ops', is_staff=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_server_timing_only_for_staff(self):
+        self.assertNotIn('Server-Timing', Client().get(reverse('index')))
+        header = self.staff_client.get(reverse('index'))['Server-Timing']
+        self.assertRegex(header, r'^db;dur=[\d.]+;desc="\d+ queries", '
+                                 r'tpl;dur=[\d.]+, total;dur=[\d.]+$')
+
+    # Anonymous pages must be rendered, not served by posts.pagecache.
+    @override_settings(REQUEST_METRICS_FLUSH=0, PAGE_CACHE=False)
+    def test_report_and_command(self):
+        for _ in range(3):
+            Client().get(reverse('index'))
+        Client().get('/no/such/page/')
+        response = self.staff_client.get(reverse('request_metrics'))
+        views = response.json()['views']
+        self.assertEqual(views['index']['requests'], 3)
+        self.assertGreater(views['index']['queries']['p50'], 1)
+        self.assertGreater(views['index']['template_ms']['p99'], 0)
+        self.assertIn('-', views)
+
+        # The command runs in a process of its own.
+        command = metrics.Recorder()
+        command.worker = 'command:1'
+        stdout = StringIO()
+        with mock.patch.object(metrics, 'recorder', command):
+            call_command('request_metrics', stdout=stdout)
+        self.assertIn('index', stdout.getvalue())
+
+    def test_report_is_staff_only(self):
+        response = Client().get(reverse('request_metrics'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_percentiles(self):
+        histogram = Counter(
+            metrics.bucket(value) for value in range(1, 101)
+        )
+        self.assertAlmostEqual(
+            metrics.percentile(histogram, 0.5), 50, delta=5
+        )
+        self.assertAlmostEqual(
+            metrics.percentile(histogram, 0.99), 99, delta=10
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'])
+class ReplicaRoutingTest(SimpleTestCase):
+    """Which database ``yatube.replicas`` reads from."""
+
+    router = replicas.ReplicaRouter()
+
+    def setUp(self):
+        self.addCleanup(cache.delete, replicas.synced_key('replica_1'))
+
+    def read_from(self, path, method='get', **extra):
+        request = getattr(RequestFactory(), method)(path, **extra)
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(User))
+            replicas.pin()
+            seen.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        response = replicas.ReplicaMiddleware(view)(request)
+        self.assertIsNone(replicas.current())
+        return seen, response
+
+    def test_feeds_read_from_replicas(self):
+        for path in ('/', '/group/cats/', '/leo/', '/leo/1/', '/follow/'):
+            with self.subTest(path=path):
+                seen, response = self.read_from(path)
+                # The write switches the request to default, but a write
+                # on the way of a read does not pin the client.
+                self.assertEqual(seen, ['replica_1', None])
+                self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_writes_pin(self):
+        for path, method in (
+            ('/leo/follow/', 'get'), ('/new/', 'post'), ('/', 'post'),
+        ):
+            with self.subTest(path=path, method=method):
+                response = self.read_from(path, method)[1]
+                self.assertEqual(
+                    response.cookies[replicas.PIN_COOKIE]['max-age'],
+                    settings.REPLICA_PIN_SECONDS,
+                )
+
+    def test_lagging_replica_is_left_for_default(self):
+        seen = []
+
+        def view(request):
+            replicas.require(100)
+            seen.append(self.router.db_for_read(User))
+            replicas.require(101)
+            seen.append(self.router.db_for_read(User))
+            return HttpResponse()
+
+        replicas.mark_synced('replica_1', 100)
+        replicas.ReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(seen, ['replica_1', None])
+        # Never synced.
+        cache.delete(replicas.synced_key('replica_1'))
+        replicas.ReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(seen[2:], [None, None])
+
+    def test_cards_newer_than_the_replica_are_not_cached(self):
+        posts = [Post(pk=1, author_id=1), Post(pk=2, author_id=1)]
+        stamps = {1: 100, 'user:1': 100, 2: 102}
+        cache.set_many({
+            cards.version_key(scope): stamp
+            for scope, stamp in stamps.items()
+        }, None)
+        self.addCleanup(cache.delete_many, [
+            cards.version_key(scope) for scope in stamps
+        ])
+
+        def view(request):
+            cards.attach_versions(posts, AnonymousUser())
+            return HttpResponse()
+
+        replicas.mark_synced('replica_1', 101)
+        replicas.ReplicaMiddleware(view)(RequestFactory().get('/'))
+        self.assertTrue(hasattr(posts[0], 'card_version'))
+        self.assertFalse(hasattr(posts[1], 'card_version'))
+        self.assertFalse(hasattr(posts[1], 'card_html'))
+
+    def test_other_views_and_pinned_clients_read_from_default(self):
+        self.assertEqual(self.read_from('/new/')[0], [None, None])
+        self.assertEqual(self.read_from('/search/')[0], [None, None])
+        self.assertEqual(self.read_from(
+            '/', HTTP_COOKIE=f'{replicas.PIN_COOKIE}=1'
+        )[0], [None, None])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.read_from('/')[0], [None, None])
+
+    def test_writes_and_migrations_go_to_default(self):
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'posts'))
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+# Replicas are mirrors of default in tests.
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaPinTest(TestCase):
+    """Clients that wrote are pinned to default."""
+
+    def test_only_writes_pin(self):
+        reader = User.objects.create_user(username='Reader')
+        author = User.objects.create_user(username='Writer')
+        client = Client()
+        client.force_login(reader)
+        client.get(reverse('profile', args=['Writer']))
+        response = client.get(reverse('index'))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
+        response = client.get(reverse('profile_follow', args=['Writer']))
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+        self.assertTrue(author.following.filter(user=reader).exists())
+
+
+class TunedSQLiteTest(SimpleTestCase):
+    """The ``tuned`` profile of ``yatube.sqlite``."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.wrapper = DatabaseWrapper({
+            **settings.DATABASES['default'],
+            **settings.DATABASE_PROFILES['tuned'],
+            'NAME': f'{directory}/db.sqlite3',
+        })
+        self.addCleanup(self.wrapper.close)
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_on_connect(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('mmap_size'), 256 * 1024 * 1024)
+        self.assertEqual(self.pragma('cache_size'), -64 * 1024)
+        self.assertEqual(self.pragma('busy_timeout'), 20000)
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+    def test_transactions_take_the_write_lock_at_once(self):
+        self.wrapper.ensure_connection()
+        other = sqlite3.connect(
+            self.wrapper.settings_dict['NAME'], timeout=0
+        )
+        self.addCleanup(other.close)
+        # What atomic() runs to begin a transaction.
+        self.wrapper._start_transaction_under_autocommit()
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+            other.execute('BEGIN IMMEDIATE')
+        self.wrapper.connection.execute('ROLLBACK')
+        other.execute('BEGIN IMMEDIATE')
+
+
+class CompressionTest(TestCase):
+    """Pages and JSON are gzipped for the clients that take it."""
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='Compressed')
+        for number in range(20):
+            author.posts.create(text=f'Сжимаемый пост {number}')
+        self.client = Client()
+
+    def test_large_pages_are_compressed(self):
+        url = reverse('index')
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertEqual(response['ETag'], f'W/{plain["ETag"]}')
+        again = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(again.status_code, 304)
+        response = self.client.get(
+            reverse('api_posts'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_small_refused_and_other_responses(self):
+        with override_settings(COMPRESS_MIN_SIZE=10 ** 6):
+            response = self.client.get(
+                reverse('index'), HTTP_ACCEPT_ENCODING='gzip'
+            )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(
+            reverse('index'), HTTP_ACCEPT_ENCODING='gzip;q=0, identity'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response = self.client.get(
+            reverse('api_posts'), {'fields': 'id'},
+            HTTP_ACCEPT_ENCODING='gzip',
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_accepted_codings(self):
+        request = RequestFactory().get(
+            '/', HTTP_ACCEPT_ENCODING='GZIP;q=0.5, br;q=0, deflate'
+        )
+        self.assertEqual(
+            compression.accepted_codings(request), {'gzip', 'deflate'}
+        )
+        self.assertEqual(compression.preferred_coding(request), 'gzip')
+
+    def test_streaming_responses(self):
+        staff = User.objects.create_user(username='Exporter', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(
+            reverse('export_posts'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode().splitlines()
+        self.assertEqual(len(lines), 20)
+
+
+class PrecompressedStaticTest(SimpleTestCase):
+    """collectstatic writes hashed names and compressed copies."""
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.root)
+        with open(os.path.join(self.source, 'site.css'), 'w') as css:
+            css.write('.card { margin: 0 auto; }\n' * 200)
+        with open(os.path.join(self.source, 'logo.png'), 'wb') as png:
+            png.write(os.urandom(2048))
+        settings_override = override_settings(
+            STATICFILES_DIRS=[self.source], STATIC_ROOT=self.root
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def test_collectstatic_writes_compressed_copies(self):
+        hashed = staticfiles.staticfiles_storage.stored_name('site.css')
+        self.assertNotEqual(hashed, 'site.css')
+        files = set(os.listdir(self.root))
+        self.assertTrue({hashed, f'{hashed}.gz', 'site.css.gz'} <= files)
+        self.assertFalse(any(name.startswith('logo')
+                             and name.endswith('.gz') for name in files))
+        with open(os.path.join(self.root, hashed), 'rb') as original, \
+                open(os.path.join(self.root, f'{hashed}.gz'), 'rb') as gz:
+            self.assertEqual(gzip.decompress(gz.read()), original.read())
+
+    def test_serve_picks_the_precompressed_copy(self):
+        hashed = staticfiles.staticfiles_storage.stored_name('site.css')
+        factory = RequestFactory()
+        response = staticfiles.serve(
+            factory.get('/', HTTP_ACCEPT_ENCODING='gzip'), hashed
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body.startswith(b'\x1f\x8b'))
+        response.close()
+        response = staticfiles.serve(factory.get('/'), 'site.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        response.close()
@@ -2,19 +2,31 @@ from django.conf import settings
 from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+
+from yatube import metrics, staticfiles
 
 urlpatterns = [
     path("about/", include("about.urls", namespace="about")),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics/", metrics.report_view, name="request_metrics"),
+    path("api/v1/", include("posts.api")),
     path("", include("posts.urls")),
 ]
 
 handler404 = "posts.views.page_not_found"
 handler500 = "posts.views.server_error"
 
+if settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<path>.*)$" % settings.STATIC_URL.lstrip("/"),
+            staticfiles.serve,
+        ),
+    ]
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT